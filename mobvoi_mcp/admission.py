@@ -0,0 +1,183 @@
+import asyncio
+import collections
+import concurrent.futures
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from typing import Callable, Optional
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_deadline = contextvars.ContextVar("mobvoi_mcp_deadline", default=None)
+
+
+class AdmissionRejectedError(Exception):
+    pass
+
+
+class DeadlineExceededError(Exception):
+    pass
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the deadline of the current call, None if it has no deadline."""
+    deadline_at = _deadline.get()
+    if deadline_at is None:
+        return None
+    return deadline_at - time.monotonic()
+
+
+def submit_in_context(executor: concurrent.futures.Executor, func: Callable, *args) -> concurrent.futures.Future:
+    """Submit func to a worker pool with a copy of the current context.
+
+    Worker threads do not inherit context variables, the copy keeps the deadline of the
+    call (remaining_time) and the parent span of tracer.span. One copy per task, a context
+    cannot be entered by two threads at the same time.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+class AdmissionController:
+    """Admission control in front of the tools.
+
+    Calls run in worker threads, at most max_concurrency at the same time. Waiting calls
+    are queued per priority class and dispatched interactive first. Bulk calls may use at
+    most max_concurrency - interactive_reserved slots, so cheap queries never wait behind
+    a full set of long paid calls. A call arriving at a full queue is shed immediately.
+
+    Every admitted tool gets an extra deadline_seconds argument. A call that cannot start
+    before its deadline is rejected; once started, the remaining time is exposed through
+    remaining_time() and used by ApiClient as request timeout.
+
+    Args:
+        max_concurrency: Maximum number of calls running at the same time.
+        queue_limits: Maximum number of waiting calls per priority class.
+        interactive_reserved: Slots only usable by interactive calls.
+        default_deadline: Deadline in seconds applied when the caller gives none, 0 for none.
+        reject: Callable(error, kwargs) building the tool result of a rejected call, kwargs
+            include the defaults of the arguments the caller left out.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        queue_limits: Optional[dict] = None,
+        interactive_reserved: int = 1,
+        default_deadline: float = 0,
+        reject: Optional[Callable] = None,
+    ):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.queue_limits = {INTERACTIVE: 64, BULK: 16}
+        self.queue_limits.update(queue_limits or {})
+        self.bulk_limit = max(self.max_concurrency - max(interactive_reserved, 0), 1)
+        self.default_deadline = default_deadline
+        self.reject = reject
+        self.__running = {INTERACTIVE: 0, BULK: 0}
+        self.__queues = {INTERACTIVE: collections.deque(), BULK: collections.deque()}
+        self.__admitted = {INTERACTIVE: 0, BULK: 0}
+        self.__shed = {INTERACTIVE: 0, BULK: 0}
+        self.__expired = {INTERACTIVE: 0, BULK: 0}
+
+    def stats(self) -> dict:
+        return {
+            PRIORITY_NAMES[priority]: {
+                "running": self.__running[priority],
+                "queued": len(self.__queues[priority]),
+                "admitted": self.__admitted[priority],
+                "shed": self.__shed[priority],
+                "expired": self.__expired[priority],
+            }
+            for priority in PRIORITY_NAMES
+        }
+
+    def __can_run(self, priority: int) -> bool:
+        if sum(self.__running.values()) >= self.max_concurrency:
+            return False
+        return priority == INTERACTIVE or self.__running[BULK] < self.bulk_limit
+
+    def __dispatch(self):
+        for priority in sorted(self.__queues):
+            queue = self.__queues[priority]
+            while queue and self.__can_run(priority):
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self.__running[priority] += 1
+                future.set_result(None)
+
+    async def __acquire(self, priority: int, deadline_at: Optional[float]):
+        waiting_ahead = any([self.__queues[p] for p in self.__queues if p <= priority])
+        if not waiting_ahead and self.__can_run(priority):
+            self.__running[priority] += 1
+            return
+        queue = self.__queues[priority]
+        if len(queue) >= self.queue_limits[priority]:
+            self.__shed[priority] += 1
+            raise AdmissionRejectedError(f"Server overloaded, {PRIORITY_NAMES[priority]} queue is full, retry later")
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        timeout = None if deadline_at is None else max(deadline_at - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # the slot may have been handed over right before the timeout
+            if future.done() and not future.cancelled():
+                self.__release(priority)
+            self.__expired[priority] += 1
+            raise DeadlineExceededError("Deadline exceeded while waiting in the admission queue")
+        except asyncio.CancelledError:
+            # the slot may have been handed over right before the cancellation
+            if future.done() and not future.cancelled():
+                self.__release(priority)
+            raise
+        finally:
+            if future in queue:
+                queue.remove(future)
+
+    def __release(self, priority: int):
+        self.__running[priority] -= 1
+        self.__dispatch()
+
+    def admit(self, priority: int):
+        """Decorate a sync tool function so that its calls go through admission control."""
+        def decorator(func: Callable):
+            signature = inspect.signature(func)
+            parameters = list(signature.parameters.values())
+            defaults = {p.name: p.default for p in parameters if p.default is not inspect.Parameter.empty}
+            parameters.append(inspect.Parameter(
+                "deadline_seconds", inspect.Parameter.KEYWORD_ONLY, default=0.0, annotation=float
+            ))
+
+            @functools.wraps(func)
+            async def wrapper(*args, deadline_seconds: float = 0.0, **kwargs):
+                deadline = deadline_seconds if deadline_seconds > 0 else self.default_deadline
+                deadline_at = time.monotonic() + deadline if deadline > 0 else None
+                try:
+                    await self.__acquire(priority, deadline_at)
+                except (AdmissionRejectedError, DeadlineExceededError) as e:
+                    logger.warning(f"{func.__name__} rejected: {str(e)}")
+                    if self.reject is None:
+                        raise
+                    return self.reject(e, {**defaults, **kwargs})
+                self.__admitted[priority] += 1
+
+                def call():
+                    _deadline.set(deadline_at)
+                    return func(*args, **kwargs)
+
+                try:
+                    return await anyio.to_thread.run_sync(contextvars.copy_context().run, call)
+                finally:
+                    self.__release(priority)
+
+            wrapper.__signature__ = signature.replace(parameters=parameters)
+            return wrapper
+        return decorator
@@ -3,9 +3,16 @@ import hashlib
 import os
 import time
 from pathlib import Path
+from typing import Optional
 
 import httpx
 
+from mobvoi_mcp.admission import DeadlineExceededError, remaining_time
+from mobvoi_mcp.capture import TrafficRecorder
+from mobvoi_mcp.routing import EndpointGroup
+from mobvoi_mcp.shared_state import RateLimiter, RateLimitExceededError
+from mobvoi_mcp.tracing import tracer
+
 
 def download_file_multi_thread(url: str, output_path: str, num_threads: int = 4, chunk_size: int = 1024*1024):
     """Download a file from a URL using multiple threads.
@@ -114,76 +121,198 @@ class ServiceNotFoundError(Exception):
         super().__init__(f"Service '{service}' not found in region '{region}', check your region and service name")
 
 class ApiClient:
-    def __init__(self, app_key: str, app_secret: str, region: str = "mainland"):
+    def __init__(
+        self,
+        app_key: str,
+        app_secret: str,
+        region: str = "mainland",
+        hosts: Optional[dict] = None,
+        recorder: Optional[TrafficRecorder] = None,
+        limiter: Optional[RateLimiter] = None,
+        keepalive_expiry: float = 60.0,
+    ):
         self.__app_key = app_key
         self.__app_secret = app_secret
 
         self.__region = region
+        # optional traffic capture, see mobvoi_mcp.capture
+        self.__recorder = recorder
+        # optional upstream budget shared with the other server processes, see mobvoi_mcp.shared_state
+        self.__limiter = limiter
 
+        # idle pooled connections are kept for keepalive_expiry seconds, instead of the 5 seconds
+        # httpx default, so the connections opened by warmup_connections outlive a quiet period
+        self.keepalive_expiry = keepalive_expiry
+        self.__timeout = 20.0
         self.__client = httpx.Client(
-            timeout=20
+            timeout=self.__timeout,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=keepalive_expiry),
         )
 
         mainland_tts_host = "https://open.mobvoi.com"
         mainland_avatar_host = "https://openman.weta365.com/metaman/open"
 
+        # naming: {group_name}.{service_name}, the path is relative to the endpoints of the group
         self.__service_dict = {
+            "tts.get_speaker_list": "/api/tts/getSpeakerList",
+            "tts.text_to_speech": "/api/tts/v1",
+            "tts.voice_clone": "/clone",
+            "avatar.photo_drive_avatar": "/image/toman/cmp",
+            "avatar.query_photo_drive_avatar": "/image/toman/cmp/result/",
+            "avatar.video_dubbing": "/video/voiceover/createTask",
+            "avatar.query_video_dubbing": "/video/voiceover/detail",
+        }
+
+        # endpoints of every service group, per region. The global region has no public
+        # endpoints yet, they are configured through hosts (MOBVOI_MCP_ENDPOINTS).
+        endpoint_dict = {
             "mainland": {
-                # naming: {group_name}.{service_name}
-                "tts.get_speaker_list": f"{mainland_tts_host}/api/tts/getSpeakerList",
-                "tts.text_to_speech": f"{mainland_tts_host}/api/tts/v1",
-                "tts.voice_clone": f"{mainland_tts_host}/clone",
-                "avatar.photo_drive_avatar": f"{mainland_avatar_host}/image/toman/cmp",
-                "avatar.query_photo_drive_avatar": f"{mainland_avatar_host}/image/toman/cmp/result/",
-                "avatar.video_dubbing": f"{mainland_avatar_host}/video/voiceover/createTask",
-                "avatar.query_video_dubbing": f"{mainland_avatar_host}/video/voiceover/detail",
+                "tts": [mainland_tts_host],
+                "avatar": [mainland_avatar_host],
             },
             "global": {
-
+                "tts": [],
+                "avatar": [],
             }
         }
+        regional_endpoints = dict(endpoint_dict.get(self.__region, {}))
+        # hosts override per service group, e.g. {"tts": ["https://a", "https://b"], "avatar": "http://127.0.0.1:8000"}
+        for group, base_urls in (hosts or {}).items():
+            regional_endpoints[group] = [base_urls] if isinstance(base_urls, str) else list(base_urls)
+        self.__endpoint_groups = {
+            group: EndpointGroup(base_urls) for group, base_urls in regional_endpoints.items() if base_urls
+        }
 
-    def __get_url(self, service: str):
-        regional_service_dict = self.__service_dict.get(self.__region, None)
-        if regional_service_dict is None:
+    def __get_route(self, service: str) -> tuple[EndpointGroup, str]:
+        service_path = self.__service_dict.get(service, None)
+        group = self.__endpoint_groups.get(service.split(".")[0], None)
+        if service_path is None or group is None:
             raise ServiceNotFoundError(service, self.__region)
-        service_url = regional_service_dict.get(service, None)
-        if service_url is None:
-            raise ServiceNotFoundError(service, self.__region)
-        return service_url
+        return group, service_path
+
+    def endpoint_stats(self) -> dict:
+        return {group_name: group.to_list() for group_name, group in self.__endpoint_groups.items()}
+
+    def warmup_connections(self, connections_per_host: int = 2):
+        """Open pooled keep-alive connections to every endpoint of the region, so the first calls skip TCP and TLS setup."""
+        hosts = sorted({
+            str(httpx.URL(endpoint.base_url).copy_with(path="/", query=None))
+            for group in self.__endpoint_groups.values()
+            for endpoint in group.endpoints
+        })
+        targets = [host for host in hosts for _ in range(max(connections_per_host, 1))]
+        if not targets:
+            return []
+
+        def open_connection(host: str):
+            with tracer.span("api.warmup_connection", host=host):
+                self.__client.head(host)
+
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = {executor.submit(open_connection, host): host for host in targets}
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    errors.append(f"{futures[future]}: {future.exception()}")
+        if errors:
+            raise Exception(f"Failed to open connections: {'; '.join(sorted(set(errors)))}")
+        return hosts
 
     def __parse_signature(self):
-        if self.__region == "mainland":
-            timestamp = int(time.time())
-            signature = hashlib.md5(f"{self.__app_key}+{self.__app_secret}+{timestamp}".encode()).hexdigest()
-            signature_info = {
-                "appKey": self.__app_key,
-                "signature": signature,
-                "timestamp": str(timestamp),
-            }
-        elif self.__region == "global":
-            # TODO: implement global signature
-            signature_info = {}
+        # the global region uses the same appKey + md5 signature scheme as mainland
+        timestamp = int(time.time())
+        signature = hashlib.md5(f"{self.__app_key}+{self.__app_secret}+{timestamp}".encode()).hexdigest()
+        signature_info = {
+            "appKey": self.__app_key,
+            "signature": signature,
+            "timestamp": str(timestamp),
+        }
         return signature_info
 
-    def post(self, service: str, request: dict = {}, headers: dict = {}, data: dict = {}, file: dict = {}, path: str = ""):
-        post_header = self.__parse_signature()
-        post_header.update(headers)
+    def __send_once(self, endpoint_url: str, method: str, service: str, request_header: dict, **kwargs):
+        extensions = {}
+        trace_hook = tracer.httpx_trace_hook()
+        if trace_hook is not None:
+            extensions["trace"] = trace_hook
+        remaining = remaining_time()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceededError(f"Deadline exceeded before calling {service}")
+            # the deadline only shortens the client timeout, a hung upstream never holds a call longer
+            kwargs["timeout"] = httpx.Timeout(min(remaining, self.__timeout))
+        request = self.__client.build_request(method, endpoint_url, headers=request_header, extensions=extensions, **kwargs)
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            response = self.__client.send(request, stream=True)
+            try:
+                response.read()
+            finally:
+                response.close()
+        except Exception as e:
+            if self.__recorder is not None:
+                self.__recorder.record(
+                    service, method, started_at, time.perf_counter() - start,
+                    int(request.headers.get("Content-Length", 0)), error=type(e).__name__,
+                )
+            raise
+        if self.__recorder is not None:
+            self.__recorder.record(
+                service, method, started_at, time.perf_counter() - start,
+                int(request.headers.get("Content-Length", 0)), len(response.content), response.status_code,
+            )
+        return response
 
-        url = self.__get_url(service)
-        if path:
-            url = f"{url}/{path}"
+    def __send(self, method: str, service: str, headers: dict, path: str, **kwargs):
+        """Send a request to the fastest healthy endpoint of the service group, failing over to the next ones.
 
-        response = self.__client.post(url, headers=post_header, json=request, data=data, files=file)
-        return response
+        Connection failures are always retried on the next endpoint, since the request never
+        reached the upstream. Other failures (timeouts, 5xx) are only retried for GET, a POST
+        may already have created a paid task upstream.
+        """
+        with tracer.span(f"api.{service}", service=service, method=method) as span:
+            with tracer.span("api.sign"):
+                request_header = self.__parse_signature()
+            request_header.update(headers)
 
-    def get(self, service: str, request: dict = {}, headers: dict = {}, path: str = ""):
-        get_header = self.__parse_signature()
-        get_header.update(headers)
+            group, service_path = self.__get_route(service)
+            if self.__limiter is not None:
+                with tracer.span("api.rate_limit"):
+                    try:
+                        self.__limiter.acquire(remaining_time())
+                    except RateLimitExceededError as e:
+                        raise DeadlineExceededError(f"{str(e)} before calling {service}")
+            endpoints = group.ranked()
+            for attempt, endpoint in enumerate(endpoints):
+                url = f"{endpoint.base_url}{service_path}"
+                if path:
+                    url = f"{url}/{path}"
+                last_attempt = attempt == len(endpoints) - 1
+                start = time.perf_counter()
+                try:
+                    response = self.__send_once(url, method, service, request_header, **kwargs)
+                except (httpx.ConnectError, httpx.ConnectTimeout):
+                    group.report(endpoint, None, False)
+                    if last_attempt:
+                        raise
+                    continue
+                except httpx.TransportError:
+                    group.report(endpoint, None, False)
+                    if last_attempt or method != "GET":
+                        raise
+                    continue
+                group.report(endpoint, time.perf_counter() - start, response.status_code < 500)
+                if response.status_code >= 500 and method == "GET" and not last_attempt:
+                    continue
+                if span is not None:
+                    span.set_attribute("http.endpoint", endpoint.base_url)
+                    span.set_attribute("http.attempts", attempt + 1)
+                    span.set_attribute("http.status_code", response.status_code)
+                    span.set_attribute("http.response_content_length", len(response.content))
+                return response
 
-        url = self.__get_url(service)
-        if path:
-            url = f"{url}/{path}"
+    def post(self, service: str, request: dict = {}, headers: dict = {}, data: dict = {}, file: dict = {}, path: str = ""):
+        return self.__send("POST", service, headers, path, json=request, data=data, files=file)
 
-        response = self.__client.get(url, headers=get_header, params=request)
-        return response
+    def get(self, service: str, request: dict = {}, headers: dict = {}, path: str = ""):
+        return self.__send("GET", service, headers, path, params=request)
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TrafficRecorder:
+    """Append the shape of every upstream request to a compact JSON lines capture file.
+
+    Only the shape is recorded, never headers, bodies, urls or task ids, so keys,
+    signatures and user content never reach the capture. One line per request:
+        {"t": epoch seconds, "s": service, "m": method, "q": request bytes,
+         "r": response bytes, "c": status code, "l": latency seconds, "e": error type}
+    Lines are appended in O_APPEND mode, so several server processes can share one file.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        output_dir = os.path.dirname(self.path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self.__fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self.__lock = threading.Lock()
+
+    def record(
+        self,
+        service: str,
+        method: str,
+        started_at: float,
+        latency: float,
+        request_bytes: int,
+        response_bytes: int = 0,
+        status_code: int = 0,
+        error: Optional[str] = None,
+    ):
+        entry = {
+            "t": round(started_at, 3),
+            "s": service,
+            "m": method,
+            "q": request_bytes,
+            "r": response_bytes,
+            "c": status_code,
+            "l": round(latency, 4),
+        }
+        if error:
+            entry["e"] = error
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            with self.__lock:
+                os.write(self.__fd, line)
+        except OSError as e:
+            logger.warning(f"Failed to write traffic capture {self.path}: {str(e)}")
+
+    def close(self):
+        os.close(self.__fd)
+
+
+def load_capture(path: str) -> list[dict]:
+    entries = []
+    with open(os.path.expanduser(path), "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # a process may have crashed in the middle of a line
+                continue
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
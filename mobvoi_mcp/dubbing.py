@@ -0,0 +1,186 @@
+import concurrent.futures
+import csv
+import logging
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from mobvoi_mcp.admission import submit_in_context
+from mobvoi_mcp.pipeline import timed, wait_for_task
+from mobvoi_mcp.utils import is_installed
+
+logger = logging.getLogger(__name__)
+
+
+class DubbingError(Exception):
+    pass
+
+
+def ffmpeg_available() -> bool:
+    return is_installed("ffmpeg")
+
+
+def _run_ffmpeg(args: list[str]):
+    try:
+        subprocess.run(["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"] + args, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise DubbingError(f"ffmpeg failed: {e.stderr.decode('utf8', errors='replace').strip()[-500:]}")
+
+
+def split_media(video_path: Path, audio_path: Path, segment_seconds: float, output_dir: Path) -> list[tuple]:
+    """
+    Split a video and its dubbing audio into segments cut at the same timestamps.
+
+    The video is cut without re-encoding, so the cuts land on the first keyframe after each
+    segment_seconds boundary. The actual cut times are read back from the segment list and
+    the audio is cut at those times into PCM WAV, to the nearest audio frame. Cut times are
+    absolute, so the offset between audio and video never accumulates across segments.
+
+    Returns:
+        list[tuple]: (video_segment, audio_segment, start, end) per segment, end is None for the last one
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    segment_list = output_dir / "segments.csv"
+    _run_ffmpeg([
+        "-i", str(video_path), "-map", "0:v:0", "-map", "0:a?", "-c", "copy",
+        "-f", "segment", "-segment_time", str(segment_seconds), "-reset_timestamps", "1",
+        "-segment_list", str(segment_list), "-segment_list_type", "csv",
+        str(output_dir / "video_%04d.mp4"),
+    ])
+    with open(segment_list, "r", encoding="utf8", newline="") as f:
+        video_segments = [(output_dir / row[0], float(row[1]), float(row[2])) for row in csv.reader(f) if row]
+    if not video_segments:
+        raise DubbingError("ffmpeg produced no video segment")
+
+    cut_times = [start for _, start, _ in video_segments[1:]]
+    audio_args = ["-i", str(audio_path), "-map", "0:a:0", "-c:a", "pcm_s16le"]
+    if cut_times:
+        audio_args += ["-f", "segment", "-segment_times", ",".join([f"{t:.6f}" for t in cut_times]), "-reset_timestamps", "1"]
+        _run_ffmpeg(audio_args + [str(output_dir / "audio_%04d.wav")])
+    else:
+        _run_ffmpeg(audio_args + [str(output_dir / "audio_0000.wav")])
+    audio_segments = sorted(output_dir.glob("audio_*.wav"))
+    if len(audio_segments) != len(video_segments):
+        raise DubbingError(
+            f"The audio splits into {len(audio_segments)} segments but the video into {len(video_segments)}, "
+            f"check that both have the same duration"
+        )
+
+    segments = []
+    for i, ((video_segment, start, end), audio_segment) in enumerate(zip(video_segments, audio_segments)):
+        segments.append((video_segment, audio_segment, start, end if i < len(video_segments) - 1 else None))
+    return segments
+
+
+def concat_videos(video_paths: list[Path], output_path: Path):
+    """Concatenate mp4 files with the same codec parameters without re-encoding."""
+    list_file = output_path.with_name(f".{output_path.name}.txt")
+    with open(list_file, "w", encoding="utf8") as f:
+        for path in video_paths:
+            escaped = str(Path(path).absolute()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        _run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", str(list_file),
+            "-c", "copy", "-movflags", "+faststart", str(output_path),
+        ])
+    finally:
+        list_file.unlink(missing_ok=True)
+
+
+class DubbingSegment:
+    def __init__(self, index: int, video_url: str, audio_url: str, start: float = 0.0, end: Optional[float] = None):
+        self.index = index
+        self.video_url = video_url
+        self.audio_url = audio_url
+        self.start = start
+        self.end = end
+        self.task_id = None
+        self.result_url = None
+        self.output_path = None
+        self.attempts = 0
+        self.error = None
+        self.timings = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "start": round(self.start, 3),
+            "end": round(self.end, 3) if self.end is not None else None,
+            "task_id": self.task_id,
+            "result_url": self.result_url,
+            "output_path": str(self.output_path) if self.output_path else None,
+            "attempts": self.attempts,
+            "error": self.error,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+
+
+class SegmentedDubbing:
+    """Render dubbing segments as parallel upstream tasks, retrying only the segments that fail.
+
+    Like AvatarPipeline, the upstream calls are injected so this stays independent of the
+    MCP server module.
+
+    Args:
+        submit: Callable(video_url, audio_url) -> dubbing task id.
+        query: Callable(task_id) -> (status, result_url, message), status in ["suc", "ing", ...].
+        download: Callable(segment, result_url) -> local path of the rendered segment.
+        poll_interval: Seconds between two status queries of one task.
+        timeout: Maximum seconds to wait for one segment to render.
+        max_workers: Number of segments rendered at the same time.
+        retries: Number of times a failed segment is tried again. A segment whose render
+            succeeded is not submitted again, only its download is retried.
+        backoff: Seconds waited before the first retry of a segment, doubled for every next one.
+    """
+
+    def __init__(
+        self,
+        submit: Callable,
+        query: Callable,
+        download: Callable,
+        poll_interval: float = 5.0,
+        timeout: float = 1800.0,
+        max_workers: int = 4,
+        retries: int = 2,
+        backoff: float = 5.0,
+    ):
+        self.submit = submit
+        self.query = query
+        self.download = download
+        self.poll_interval = max(poll_interval, 0.5)
+        self.timeout = timeout
+        self.max_workers = max(max_workers, 1)
+        self.retries = max(retries, 0)
+        self.backoff = max(backoff, 0.0)
+
+    def __run_segment(self, segment: DubbingSegment) -> DubbingSegment:
+        start = time.perf_counter()
+        while True:
+            segment.attempts += 1
+            try:
+                # the render is paid, once it succeeded only the download is retried
+                if segment.result_url is None:
+                    segment.task_id = timed(segment.timings, "submit", self.submit, segment.video_url, segment.audio_url)
+                    segment.result_url = timed(
+                        segment.timings, "render", wait_for_task, self.query, segment.task_id, self.poll_interval, self.timeout
+                    )
+                segment.output_path = timed(segment.timings, "download", self.download, segment, segment.result_url)
+                segment.error = None
+                break
+            except Exception as e:
+                logger.exception(f"Dubbing segment {segment.index} attempt {segment.attempts} failed: {str(e)}")
+                segment.error = str(e)
+                if segment.attempts > self.retries:
+                    break
+                time.sleep(min(self.backoff * 2 ** (segment.attempts - 1), 60.0))
+        segment.timings["total"] = time.perf_counter() - start
+        return segment
+
+    def run(self, segments: list[DubbingSegment]) -> list[DubbingSegment]:
+        workers = min(self.max_workers, len(segments)) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [submit_in_context(executor, self.__run_segment, segment) for segment in segments]
+            concurrent.futures.wait(futures)
+        return segments
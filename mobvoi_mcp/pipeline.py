@@ -0,0 +1,140 @@
+import concurrent.futures
+import logging
+import time
+from typing import Callable, Optional
+
+from mobvoi_mcp.admission import submit_in_context
+from mobvoi_mcp.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineError(Exception):
+    pass
+
+
+def timed(timings: dict, stage: str, func: Callable, *args):
+    """Call func, adding its wall time to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def wait_for_task(query: Callable, task_id: str, poll_interval: float, timeout: float) -> str:
+    """
+    Poll an upstream render task until it succeeds.
+
+    Args:
+        query: Callable(task_id) -> (status, result_url, message), status in ["suc", "ing", ...].
+
+    Returns:
+        str: The result url of the task.
+
+    Raises:
+        PipelineError: If the task fails, succeeds without a result or does not finish within timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        status, result_url, message = query(task_id)
+        if status == "suc":
+            if not result_url:
+                raise PipelineError(f"Task {task_id} succeeded without a result url")
+            return result_url
+        if status != "ing":
+            raise PipelineError(f"Task {task_id} failed with status: {status}, message: {message}")
+        if time.monotonic() + poll_interval > deadline:
+            raise PipelineError(f"Task {task_id} did not finish within {timeout} seconds")
+        time.sleep(poll_interval)
+
+
+class AvatarJob:
+    def __init__(self, index: int, text: str):
+        self.index = index
+        self.text = text
+        self.audio_path = None
+        self.audio_url = None
+        self.task_id = None
+        self.result_url = None
+        self.output_path = None
+        self.error = None
+        self.timings = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "audio_path": str(self.audio_path) if self.audio_path else None,
+            "audio_url": self.audio_url,
+            "task_id": self.task_id,
+            "result_url": self.result_url,
+            "output_path": str(self.output_path) if self.output_path else None,
+            "error": self.error,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+
+
+class AvatarPipeline:
+    """Run text -> speech -> publish -> avatar render -> download for a batch of texts.
+
+    Every job walks the stages in order, but jobs run on a shared worker pool so the
+    synthesis and submission of the next job overlap with the rendering of the previous one.
+    Stage callables are injected so the pipeline stays independent of the MCP server module.
+
+    Args:
+        synthesize: Callable(text) -> local path of the synthesized audio.
+        publish: Callable(audio_path) -> public URL the avatar service can fetch.
+        submit: Callable(audio_url) -> avatar task id.
+        query: Callable(task_id) -> (status, result_url, message), status in ["suc", "ing", ...].
+        download: Callable(task_id, result_url) -> local path of the saved video, or None.
+        poll_interval: Seconds between two status queries of one task.
+        timeout: Maximum seconds to wait for one task to render.
+        max_workers: Number of jobs in flight at the same time.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable,
+        publish: Callable,
+        submit: Callable,
+        query: Callable,
+        download: Optional[Callable] = None,
+        poll_interval: float = 5.0,
+        timeout: float = 600.0,
+        max_workers: int = 4,
+    ):
+        self.synthesize = synthesize
+        self.publish = publish
+        self.submit = submit
+        self.query = query
+        self.download = download
+        self.poll_interval = max(poll_interval, 0.5)
+        self.timeout = timeout
+        self.max_workers = max(max_workers, 1)
+
+    def __run_job(self, job: AvatarJob) -> AvatarJob:
+        with tracer.span("avatar.job", index=job.index):
+            return self.__run_stages(job)
+
+    def __run_stages(self, job: AvatarJob) -> AvatarJob:
+        start = time.perf_counter()
+        try:
+            job.audio_path = timed(job.timings, "synthesize", self.synthesize, job.text)
+            job.audio_url = timed(job.timings, "publish", self.publish, job.audio_path)
+            job.task_id = timed(job.timings, "submit", self.submit, job.audio_url)
+            job.result_url = timed(job.timings, "render", wait_for_task, self.query, job.task_id, self.poll_interval, self.timeout)
+            if self.download is not None:
+                job.output_path = timed(job.timings, "download", self.download, job.task_id, job.result_url)
+        except Exception as e:
+            logger.exception(f"Avatar pipeline job {job.index} failed: {str(e)}")
+            job.error = str(e)
+        job.timings["total"] = time.perf_counter() - start
+        return job
+
+    def run(self, texts: list[str]) -> list[AvatarJob]:
+        jobs = [AvatarJob(i, text) for i, text in enumerate(texts)]
+        workers = min(self.max_workers, len(jobs)) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [submit_in_context(executor, self.__run_job, job) for job in jobs]
+            concurrent.futures.wait(futures)
+        return jobs
@@ -0,0 +1,285 @@
+import concurrent.futures
+import hashlib
+import logging
+import struct
+import time
+from typing import Optional
+
+import httpx
+
+from mobvoi_mcp.admission import remaining_time, submit_in_context
+from mobvoi_mcp.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# generous defaults, they only catch inputs the upstream can never render
+DEFAULT_LIMITS = {
+    "image": {"max_bytes": 20 * 1024 * 1024},
+    "audio": {"max_bytes": 200 * 1024 * 1024, "max_duration": 1800},
+    "video": {"max_bytes": 2 * 1024 * 1024 * 1024, "max_duration": 1800},
+}
+
+# kbps, indexed by the 4 bit bitrate index of the frame header
+_MP3_BITRATES = {
+    "mpeg1": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    "mpeg2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+
+
+class PreflightError(Exception):
+    pass
+
+
+def _sniff_kind(head: bytes) -> Optional[str]:
+    if head.startswith(b"\x89PNG") or head.startswith(b"\xff\xd8\xff") or head[:4] == b"GIF8":
+        return "image"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio"
+    if head.startswith(b"ID3") or head.startswith(b"OggS") or head.startswith(b"fLaC"):
+        return "audio"
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio"
+    if head[4:8] == b"ftyp":
+        # isom, mp42, dash... hold audio only as well as video, the content type decides
+        return "audio" if head[8:11] in [b"M4A", b"M4B"] else None
+    if head[:4] == b"\x1a\x45\xdf\xa3":
+        return "video"
+    markup = head.lstrip()
+    if markup[:1] == b"<":
+        if b"<svg" in markup[:1024].lower():
+            return "image"
+        # any xml document, the content type decides
+        if markup.startswith(b"<?xml"):
+            return None
+        # error pages served with the media content type of the requested name
+        return "text"
+    if markup[:1] == b"{":
+        return "text"
+    return None
+
+
+def _header_kind(content_type: str) -> Optional[str]:
+    for kind in ["image", "audio", "video"]:
+        if content_type.startswith(f"{kind}/"):
+            return kind
+    if content_type.startswith("text/") or content_type in ["application/json", "application/xml"]:
+        return "text"
+    return None
+
+
+def _wav_duration(head: bytes, size: int) -> Optional[float]:
+    byte_rate, offset = None, 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = head[offset:offset + 4], struct.unpack("<I", head[offset + 4:offset + 8])[0]
+        if chunk_id == b"fmt " and offset + 20 <= len(head):
+            byte_rate = struct.unpack("<I", head[offset + 16:offset + 20])[0]
+        elif chunk_id == b"data":
+            if not byte_rate:
+                return None
+            # streamed wav files leave the data size at 0 or 0xFFFFFFFF
+            data_size = chunk_size if 0 < chunk_size < 0xFFFFFFFF else size - offset - 8
+            return data_size / byte_rate
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _mp3_duration(head: bytes, size: int) -> Optional[float]:
+    offset = 0
+    if head.startswith(b"ID3") and len(head) >= 10:
+        # syncsafe size of the ID3v2 tag
+        offset = 10 + (head[6] << 21 | head[7] << 14 | head[8] << 7 | head[9])
+    while offset + 4 <= len(head):
+        if head[offset] == 0xFF and head[offset + 1] & 0xE0 == 0xE0:
+            version = "mpeg1" if head[offset + 1] & 0x18 == 0x18 else "mpeg2"
+            bitrate = _MP3_BITRATES[version][head[offset + 2] >> 4]
+            if bitrate:
+                # constant bitrate estimate, good enough for a limit check
+                return (size - offset) * 8 / (bitrate * 1000)
+        offset += 1
+    return None
+
+
+def _mp4_duration(head: bytes) -> Optional[float]:
+    # only found when the moov box is at the front of the file (fast start)
+    index = head.find(b"mvhd")
+    if index < 0:
+        return None
+    box = head[index + 4:]
+    if box[:1] == b"\x01" and len(box) >= 32:
+        timescale, duration = struct.unpack(">IQ", box[20:32])
+    elif len(box) >= 20:
+        timescale, duration = struct.unpack(">II", box[12:20])
+    else:
+        return None
+    return duration / timescale if timescale else None
+
+
+def _duration(head: bytes, size: int) -> Optional[float]:
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return _wav_duration(head, size)
+    if head[4:8] == b"ftyp":
+        return _mp4_duration(head)
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return _mp3_duration(head, size)
+    return None
+
+
+class Preflight:
+    """Cheap validation of media urls before they are submitted to a paid, slow upstream job.
+
+    Every url is probed with a ranged GET of its first probe_bytes bytes (HEAD is often
+    not allowed on presigned urls). The status, content type, size and a sniff of the
+    first bytes (magic numbers, WAV / MP3 / MP4 headers for the duration) are checked
+    against per kind limits.
+
+    Verdicts are cached per url in the store. A verdict is trusted for fresh_for seconds,
+    then revalidated with If-None-Match when the server gave an ETag: a 304 keeps the
+    verdict without downloading anything, otherwise the url is probed again.
+
+    Args:
+        store: SharedStore or LocalStore keeping the verdicts.
+        limits: Per kind overrides of DEFAULT_LIMITS, e.g. {"audio": {"max_duration": 600}}.
+        fresh_for: Seconds a cached verdict is used without revalidation.
+        ttl: Seconds a verdict is kept for revalidation.
+        timeout: Probe timeout in seconds, shortened by the deadline of the call.
+        probe_bytes: Number of bytes downloaded for the sniff.
+        max_workers: Maximum number of urls probed at the same time.
+    """
+
+    def __init__(
+        self,
+        store,
+        limits: Optional[dict] = None,
+        fresh_for: float = 60.0,
+        ttl: float = 86400.0,
+        timeout: float = 5.0,
+        probe_bytes: int = 65536,
+        max_workers: int = 8,
+    ):
+        self.store = store
+        self.limits = {kind: dict(limit) for kind, limit in DEFAULT_LIMITS.items()}
+        for kind, limit in (limits or {}).items():
+            self.limits.setdefault(kind, {}).update(limit)
+        self.fresh_for = fresh_for
+        self.ttl = ttl
+        self.timeout = timeout
+        self.probe_bytes = probe_bytes
+        self.max_workers = max_workers
+        self.__client = httpx.Client(follow_redirects=True)
+
+    def __timeout(self) -> float:
+        remaining = remaining_time()
+        if remaining is None:
+            return self.timeout
+        if remaining <= 0:
+            raise PreflightError("Deadline exceeded before the preflight checks")
+        return min(self.timeout, remaining)
+
+    def __evaluate(self, kind: str, response: httpx.Response, head: bytes) -> dict:
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        size = None
+        content_range = response.headers.get("Content-Range", "")
+        if response.status_code == 206 and "/" in content_range and not content_range.endswith("/*"):
+            size = int(content_range.rsplit("/", 1)[1])
+        elif response.status_code == 200 and "Content-Length" in response.headers:
+            size = int(response.headers["Content-Length"])
+        verdict = {
+            "ok": True,
+            "kind": kind,
+            "content_type": content_type,
+            "size": size,
+            "duration": None,
+            "etag": response.headers.get("ETag"),
+        }
+
+        detected = _sniff_kind(head) or _header_kind(content_type)
+        if detected is not None and detected != kind:
+            return {**verdict, "ok": False, "reason": f"is {detected} content ({content_type or 'no content type'}), expected {kind}"}
+        if size == 0 or not head:
+            return {**verdict, "ok": False, "reason": "is empty"}
+        if kind in ["audio", "video"]:
+            duration = _duration(head, size or len(head))
+            verdict["duration"] = round(duration, 3) if duration is not None else None
+        return verdict
+
+    def __apply_limits(self, verdict: dict) -> dict:
+        if not verdict["ok"]:
+            return verdict
+        limit = self.limits.get(verdict["kind"], {})
+        size, duration = verdict.get("size"), verdict.get("duration")
+        if size is not None and limit.get("max_bytes") and size > limit["max_bytes"]:
+            return {**verdict, "ok": False, "reason": f"is {size} bytes, more than the {limit['max_bytes']} bytes limit"}
+        if duration is not None and limit.get("max_duration") and duration > limit["max_duration"]:
+            return {**verdict, "ok": False, "reason": f"lasts {duration:.0f}s, more than the {limit['max_duration']}s limit"}
+        return verdict
+
+    def __probe(self, url: str, kind: str, cached: Optional[dict]) -> dict:
+        headers = {"Range": f"bytes=0-{self.probe_bytes - 1}"}
+        if cached is not None and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        try:
+            with tracer.span("preflight.probe", kind=kind):
+                with self.__client.stream("GET", url, headers=headers, timeout=self.__timeout()) as response:
+                    if response.status_code == 304 and cached is not None:
+                        return cached
+                    if response.status_code >= 400:
+                        return {"ok": False, "kind": kind, "etag": None, "reason": f"returned HTTP {response.status_code}"}
+                    head = b""
+                    for chunk in response.iter_bytes():
+                        head += chunk
+                        if len(head) >= self.probe_bytes:
+                            break
+                    return self.__evaluate(kind, response, head[:self.probe_bytes])
+        except httpx.HTTPError as e:
+            return {"ok": False, "kind": kind, "etag": None, "reason": f"is unreachable: {type(e).__name__}"}
+
+    def check(self, url: str, kind: str, limits: bool = True, max_age: Optional[float] = None) -> dict:
+        """
+        Check one media url.
+
+        Args:
+            url: The media url.
+            kind: "image", "audio" or "video".
+            limits: Also enforce the size and duration limits of the kind. Without them only
+                reachability and the media kind are checked, e.g. for a source that is split
+                before submission.
+            max_age: Seconds a cached verdict is used without revalidation, fresh_for by default.
+                0 probes the url again, e.g. when retrying after a failure.
+
+        Returns:
+            dict: The verdict, {"ok": bool, "reason": str if not ok, "content_type", "size", "duration", ...}
+        """
+        if not url.startswith(("http://", "https://")):
+            return {"ok": False, "kind": kind, "url": url, "reason": "is not an http(s) url"}
+        key = f"preflight:{kind}:{hashlib.sha1(url.encode('utf8')).hexdigest()}"
+        cached = self.store.get(key)
+        max_age = self.fresh_for if max_age is None else max_age
+        if cached is not None and time.time() - cached["checked_at"] < max_age:
+            verdict = {**cached, "cached": True}
+        else:
+            verdict = dict(self.__probe(url, kind, cached))
+            verdict["checked_at"] = time.time()
+            # the cached verdict holds what the probe found, limits are applied per call
+            # failures without an ETag (unreachable, HTTP errors) are only kept for the fresh period
+            self.store.set(key, verdict, self.ttl if verdict.get("etag") else self.fresh_for)
+            verdict["cached"] = False
+        if limits:
+            verdict = self.__apply_limits(verdict)
+        return {**verdict, "url": url}
+
+    def validate(self, items: list[tuple[str, str]], limits: bool = True, max_age: Optional[float] = None) -> list[dict]:
+        """
+        Check (url, kind) pairs concurrently, see check for limits and max_age.
+
+        Raises:
+            PreflightError: If any url fails its checks, listing every failure.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(min(len(items), self.max_workers), 1)) as executor:
+            futures = [submit_in_context(executor, self.check, url, kind, limits, max_age) for url, kind in items]
+            verdicts = [future.result() for future in futures]
+        failures = [f"{verdict['kind']} url {verdict['url']} {verdict['reason']}" for verdict in verdicts if not verdict["ok"]]
+        if failures:
+            raise PreflightError(f"Preflight check failed: {'; '.join(failures)}")
+        return verdicts
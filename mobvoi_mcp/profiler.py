@@ -0,0 +1,78 @@
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling the stacks of all threads from a background thread.
+
+    The result is written in the folded stack format ("frame;frame;frame count" per line)
+    understood by flamegraph.pl, speedscope and inferno.
+    """
+
+    def __init__(self, output_file: str, duration: float, interval: float = 0.01):
+        self.output_file = output_file
+        self.duration = duration
+        self.interval = interval
+        self.samples = 0
+        self.__stacks = collections.Counter()
+        self.__thread = None
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, name="mobvoi-mcp-profiler", daemon=True)
+        self.__thread.start()
+
+    def __sample(self, own_id: int):
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            self.__stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def __run(self):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            self.__sample(own_id)
+            time.sleep(self.interval)
+        self.dump()
+
+    def dump(self):
+        output_dir = os.path.dirname(self.output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(self.output_file, "w", encoding="utf-8") as f:
+            for stack, count in self.__stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Profile with {self.samples} samples written: {self.output_file}")
+
+
+_active_profiler: Optional[SamplingProfiler] = None
+_active_lock = threading.Lock()
+
+
+def start_profiler(output_file: str, duration: float, interval: float = 0.01) -> SamplingProfiler:
+    global _active_profiler
+    with _active_lock:
+        if _active_profiler is not None and _active_profiler.running:
+            raise RuntimeError(f"A profiler is already running, writing to {_active_profiler.output_file}")
+        _active_profiler = SamplingProfiler(output_file, duration, interval)
+        _active_profiler.start()
+        return _active_profiler
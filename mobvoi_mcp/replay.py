@@ -0,0 +1,218 @@
+"""Replay a traffic capture against a local stand-in of the Mobvoi endpoints.
+
+Usage:
+    mobvoi-mcp-replay capture.jsonl --speed 10 --concurrency 64
+
+The capture is written by the server when MOBVOI_MCP_CAPTURE_FILE is set. Requests are
+sent through ApiClient at their recorded offsets divided by the speed factor. The stand-in
+answers each request with the recorded response size after the recorded upstream latency,
+so the replay reproduces the real mix of services, payload sizes and polling cadence.
+Requests that failed without a response in the capture (connection errors, timeouts)
+are answered by closing the connection after the recorded latency.
+"""
+import argparse
+import concurrent.futures
+import http.server
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Optional
+
+from mobvoi_mcp.api_client import ApiClient
+from mobvoi_mcp.capture import load_capture
+
+logger = logging.getLogger(__name__)
+
+REPLAY_LATENCY_HEADER = "X-Replay-Latency"
+REPLAY_RESPONSE_BYTES_HEADER = "X-Replay-Response-Bytes"
+REPLAY_STATUS_HEADER = "X-Replay-Status"
+REPLAY_ERROR_HEADER = "X-Replay-Error"
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # headers and body are written separately, avoid the Nagle / delayed ACK stall
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def __respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        time.sleep(float(self.headers.get(REPLAY_LATENCY_HEADER, 0)))
+        if REPLAY_ERROR_HEADER in self.headers:
+            # no response at all, the client fails with a transport error
+            self.close_connection = True
+            return
+        body = b"0" * int(self.headers.get(REPLAY_RESPONSE_BYTES_HEADER, 0))
+        self.send_response(int(self.headers.get(REPLAY_STATUS_HEADER, 200)))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    do_GET = __respond
+    do_POST = __respond
+    do_HEAD = __respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer:
+    """Local HTTP server standing in for every Mobvoi endpoint, driven by the replay headers."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.__server = http.server.ThreadingHTTPServer((host, port), _StandInHandler)
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="mobvoi-mcp-stand-in", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(int(round(percent / 100 * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def _summarize(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50": round(_percentile(latencies, 50), 4),
+        "p90": round(_percentile(latencies, 90), 4),
+        "p99": round(_percentile(latencies, 99), 4),
+        "max": round(max(latencies), 4) if latencies else 0.0,
+    }
+
+
+def replay(
+    entries: list[dict],
+    speed: float = 1.0,
+    concurrency: int = 64,
+    scale_latency: bool = False,
+    target: Optional[str] = None,
+) -> dict:
+    """
+    Replay capture entries and report throughput and latency distributions.
+
+    Args:
+        entries: Capture entries, as returned by load_capture.
+        speed: Time compression factor from 1 to 100, 10 replays one hour of traffic in six minutes.
+        concurrency: Maximum number of requests in flight.
+        scale_latency: Also divide the emulated upstream latency by the speed factor.
+        target: Base url of the endpoints, a local stand-in is started if not given.
+
+    Returns:
+        dict: Overall and per-service results.
+    """
+    speed = min(max(speed, 1.0), 100.0)
+    stand_in = None
+    if target is None:
+        stand_in = StandInServer()
+        stand_in.start()
+        target = stand_in.url
+    client = ApiClient("replay", "replay", hosts={"tts": target, "avatar": target})
+
+    results = []
+    results_lock = threading.Lock()
+
+    def send(entry: dict, scheduled_at: float):
+        lag = time.perf_counter() - scheduled_at
+        latency = entry.get("l", 0) / speed if scale_latency else entry.get("l", 0)
+        headers = {
+            REPLAY_LATENCY_HEADER: str(latency),
+            REPLAY_RESPONSE_BYTES_HEADER: str(entry.get("r", 0)),
+            REPLAY_STATUS_HEADER: str(entry.get("c") or 200),
+        }
+        if entry.get("e"):
+            headers[REPLAY_ERROR_HEADER] = entry["e"]
+        start = time.perf_counter()
+        error = None
+        try:
+            if entry.get("m") == "GET":
+                response = client.get(entry["s"], headers=headers)
+            else:
+                response = client.post(entry["s"], request={"pad": "0" * max(entry.get("q", 0) - 12, 0)}, headers=headers)
+            # replayed upstream failures count as errors, like in the capture
+            if response.status_code >= 500:
+                error = f"HTTP {response.status_code}"
+        except Exception as e:
+            error = type(e).__name__
+        with results_lock:
+            results.append((entry["s"], time.perf_counter() - start, lag, error))
+
+    try:
+        origin = entries[0]["t"] if entries else 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            for entry in entries:
+                scheduled_at = start + (entry["t"] - origin) / speed
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(send, entry, scheduled_at)
+        elapsed = time.perf_counter() - start
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+
+    services = {}
+    for service, latency, _, error in results:
+        stats = services.setdefault(service, {"latencies": [], "errors": 0})
+        stats["latencies"].append(latency)
+        stats["errors"] += 1 if error else 0
+    return {
+        "requests": len(results),
+        "errors": len([result for result in results if result[3]]),
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency": _summarize([result[1] for result in results]),
+        "schedule_lag": _summarize([result[2] for result in results]),
+        "services": {
+            service: {**_summarize(stats["latencies"]), "errors": stats["errors"]}
+            for service, stats in sorted(services.items())
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay a mobvoi-mcp traffic capture against a local stand-in of the Mobvoi endpoints.")
+    parser.add_argument("capture", help="Capture file written with MOBVOI_MCP_CAPTURE_FILE")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor, from 1 to 100, default 1")
+    parser.add_argument("--concurrency", type=int, default=64, help="Maximum number of requests in flight, default 64")
+    parser.add_argument("--scale-latency", action="store_true", help="Also divide the emulated upstream latency by the speed factor")
+    parser.add_argument("--target", default=None, help="Base url of an already running stand-in, default is a local one")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    entries = load_capture(args.capture)
+    report = replay(entries, args.speed, args.concurrency, args.scale_latency, args.target)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"requests: {report['requests']}, errors: {report['errors']}, elapsed: {report['elapsed']}s, throughput: {report['throughput']} req/s")
+    print(f"latency: {report['latency']}")
+    print(f"schedule lag: {report['schedule_lag']}")
+    for service, stats in report["services"].items():
+        print(f"  {service}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
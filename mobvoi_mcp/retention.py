@@ -0,0 +1,297 @@
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (directory, name)
+);
+CREATE INDEX IF NOT EXISTS files_lru ON files (directory, last_used);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN
+    INSERT INTO directories VALUES (new.directory, 1, new.size)
+        ON CONFLICT (directory) DO UPDATE SET files = files + 1, bytes = bytes + new.size;
+END;
+CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN
+    UPDATE directories SET files = files - 1, bytes = bytes - old.size WHERE directory = old.directory;
+END;
+CREATE TRIGGER IF NOT EXISTS files_update AFTER UPDATE OF size ON files BEGIN
+    UPDATE directories SET bytes = bytes + new.size - old.size WHERE directory = new.directory;
+END;
+CREATE TABLE IF NOT EXISTS pins (
+    path TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    pinned_at REAL NOT NULL,
+    PRIMARY KEY (path, pid)
+);
+"""
+
+
+class Quota:
+    def __init__(self, max_bytes: int = 0, max_files: int = 0, max_age: float = 0):
+        # 0 means unlimited
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.max_age = max_age
+
+    def to_dict(self) -> dict:
+        return {"max_bytes": self.max_bytes, "max_files": self.max_files, "max_age": self.max_age}
+
+
+class RetentionManager:
+    """Disk quotas and garbage collection for the files written by the server.
+
+    Only files recorded through this manager are ever considered for eviction, the output
+    directory (by default $HOME/Desktop) may hold user files that must not be touched.
+
+    The index of managed files and the pins live in a SQLite database in WAL mode shared
+    by every server process of the machine, so each process sees and evicts the files of
+    the others, and never evicts a file another process has pinned. An eviction removes
+    the file while holding the database write lock, which pinning also needs, so a file is
+    either pinned first and kept, or removed before the pin and written again from scratch.
+    Pins of a crashed process are ignored after pin_timeout seconds.
+
+    The background sweeper is incremental: every tick it re-stats at most batch_size
+    indexed files (round robin) to drop vanished ones, then evicts expired files and the
+    least recently used files of directories over quota, also at most batch_size per tick.
+    File count and bytes per directory are kept up to date by triggers and candidates are
+    read oldest first from an index, so a tick never reads the whole index.
+    Files pinned with in_use() (downloads in flight, phrase bank copies) are never evicted.
+
+    Args:
+        index_file: SQLite database of the index.
+        default_quota: Quota applied to directories without an explicit one, see set_quota.
+        sweep_interval: Seconds between two sweeper ticks.
+        batch_size: Maximum number of files checked and evicted per tick.
+        pin_timeout: Seconds after which a pin is considered left over by a crashed process.
+    """
+
+    def __init__(
+        self,
+        index_file: Path,
+        default_quota: Optional[Quota] = None,
+        sweep_interval: float = 60.0,
+        batch_size: int = 200,
+        pin_timeout: float = 6 * 3600.0,
+    ):
+        self.index_file = index_file
+        self.default_quota = default_quota or Quota()
+        self.sweep_interval = sweep_interval
+        self.batch_size = max(batch_size, 1)
+        self.pin_timeout = pin_timeout
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.__quotas = {}
+        self.__cursor = 0
+        self.__local = threading.local()
+        self.__database = str(index_file)
+        self.__stop = threading.Event()
+        self.__thread = None
+        try:
+            self.index_file.parent.mkdir(parents=True, exist_ok=True)
+            self.__connection().executescript(_SCHEMA)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Failed to open retention index {self.index_file}, the index is per process: {str(e)}")
+            self.__local = threading.local()
+            self.__database = f"file:mobvoi_mcp_retention_{id(self)}?mode=memory&cache=shared"
+            self.__connection().executescript(_SCHEMA)
+        # pins left by an earlier process with the same pid
+        self.__execute("DELETE FROM pins WHERE pid = ?", (os.getpid(),))
+        # totals of an index written before the triggers existed
+        self.__execute("INSERT OR IGNORE INTO directories SELECT directory, COUNT(*), SUM(size) FROM files GROUP BY directory")
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # autocommit mode, transactions are opened explicitly
+            connection = sqlite3.connect(self.__database, timeout=5.0, isolation_level=None, uri=self.__database.startswith("file:"))
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def __execute(self, sql: str, params: tuple = ()) -> list:
+        try:
+            return self.__connection().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Retention index query failed: {str(e)}")
+            return []
+
+    @staticmethod
+    def __split(path: Union[str, Path]) -> tuple[str, str]:
+        path = Path(path).expanduser().absolute()
+        return str(path.parent), path.name
+
+    def set_quota(self, directory: Union[str, Path], quota: Quota):
+        self.__quotas[str(Path(directory).expanduser().absolute())] = quota
+
+    def quota_for(self, directory: str) -> Quota:
+        return self.__quotas.get(directory, self.default_quota)
+
+    @contextlib.contextmanager
+    def in_use(self, path: Union[str, Path]):
+        """Pin a file while it is written or read, no server process evicts pinned files."""
+        key = str(Path(path).expanduser().absolute())
+        pid = os.getpid()
+        self.__execute(
+            "INSERT INTO pins VALUES (?, ?, 1, ?) ON CONFLICT (path, pid) DO UPDATE SET count = count + 1, pinned_at = excluded.pinned_at",
+            (key, pid, time.time()),
+        )
+        try:
+            yield
+        finally:
+            self.__execute("UPDATE pins SET count = count - 1 WHERE path = ? AND pid = ?", (key, pid))
+            self.__execute("DELETE FROM pins WHERE path = ? AND pid = ? AND count <= 0", (key, pid))
+
+    @contextlib.contextmanager
+    def writing(self, path: Union[str, Path]):
+        """Pin a file while it is written and record it once the write succeeded."""
+        with self.in_use(path):
+            yield
+            self.record(path)
+
+    def record(self, path: Union[str, Path]):
+        directory, name = self.__split(path)
+        try:
+            size = os.stat(os.path.join(directory, name)).st_size
+        except OSError:
+            return
+        # an upsert, not INSERT OR REPLACE, so that the update trigger keeps the directory totals right
+        self.__execute(
+            "INSERT INTO files VALUES (?, ?, ?, ?) ON CONFLICT (directory, name) DO UPDATE SET size = excluded.size, last_used = excluded.last_used",
+            (directory, name, size, time.time()),
+        )
+
+    def touch(self, path: Union[str, Path]):
+        directory, name = self.__split(path)
+        self.__execute("UPDATE files SET last_used = ? WHERE directory = ? AND name = ?", (time.time(), directory, name))
+
+    def __pinned(self, now: float) -> set:
+        return {row[0] for row in self.__execute("SELECT path FROM pins WHERE pinned_at > ?", (now - self.pin_timeout,))}
+
+    def usage(self) -> list[dict]:
+        pinned = self.__pinned(time.time())
+        result = []
+        rows = self.__execute("SELECT directory, files, bytes FROM directories WHERE files > 0 ORDER BY directory")
+        for directory, files, size in rows:
+            result.append({
+                "directory": directory,
+                "files": files,
+                "bytes": size,
+                "in_flight": len([key for key in pinned if os.path.dirname(key) == directory]),
+                "quota": self.quota_for(directory).to_dict(),
+            })
+        return result
+
+    def __verify_batch(self):
+        """Re-stat the next batch of indexed files, dropping vanished ones and refreshing sizes."""
+        batch = self.__execute(
+            "SELECT rowid, directory, name FROM files WHERE rowid > ? ORDER BY rowid LIMIT ?", (self.__cursor, self.batch_size)
+        )
+        self.__cursor = batch[-1][0] if len(batch) == self.batch_size else 0
+        for _, directory, name in batch:
+            try:
+                size = os.stat(os.path.join(directory, name)).st_size
+            except FileNotFoundError:
+                self.__execute("DELETE FROM files WHERE directory = ? AND name = ?", (directory, name))
+                continue
+            except OSError:
+                continue
+            self.__execute("UPDATE files SET size = ? WHERE directory = ? AND name = ?", (size, directory, name))
+
+    def __select_evictions(self, now: float) -> list[tuple[str, str]]:
+        victims = []
+        for directory, files, size in self.__execute("SELECT directory, files, bytes FROM directories WHERE files > 0"):
+            budget = self.batch_size - len(victims)
+            if budget <= 0:
+                break
+            quota = self.quota_for(directory)
+            excess_files = files - quota.max_files if quota.max_files > 0 else 0
+            excess_bytes = size - quota.max_bytes if quota.max_bytes > 0 else 0
+            if excess_files <= 0 and excess_bytes <= 0 and quota.max_age <= 0:
+                continue
+            # least recently used first, the expired files come first too
+            candidates = self.__execute(
+                "SELECT name, size, last_used FROM files WHERE directory = ? AND NOT EXISTS ("
+                "SELECT 1 FROM pins WHERE pins.path = ? || files.name AND pins.pinned_at > ?"
+                ") ORDER BY last_used LIMIT ?",
+                (directory, os.path.join(directory, ""), now - self.pin_timeout, budget),
+            )
+            for name, file_size, last_used in candidates:
+                expired = quota.max_age > 0 and now - last_used > quota.max_age
+                if not expired and excess_files <= 0 and excess_bytes <= 0:
+                    break
+                victims.append((directory, name))
+                excess_files -= 1
+                excess_bytes -= file_size
+        return victims
+
+    def __evict(self, directory: str, name: str):
+        path = os.path.join(directory, name)
+        try:
+            connection = self.__connection()
+            # the file is removed under the write lock, a concurrent pin waits for it
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                pinned = connection.execute(
+                    "SELECT 1 FROM pins WHERE path = ? AND pinned_at > ?", (path, time.time() - self.pin_timeout)
+                ).fetchone()
+                row = connection.execute("SELECT size FROM files WHERE directory = ? AND name = ?", (directory, name)).fetchone()
+                if pinned or row is None:
+                    connection.execute("ROLLBACK")
+                    return
+                connection.execute("DELETE FROM files WHERE directory = ? AND name = ?", (directory, name))
+                try:
+                    os.remove(path)
+                    self.evicted_files += 1
+                    self.evicted_bytes += row[0]
+                    logger.info(f"Retention evicted {path} ({row[0]} bytes)")
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Retention failed to evict {path}: {str(e)}")
+                    connection.execute("ROLLBACK")
+                    return
+                connection.execute("COMMIT")
+            except BaseException:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Retention failed to evict {path}: {str(e)}")
+
+    def sweep(self):
+        """Run one incremental sweeper tick."""
+        self.__verify_batch()
+        for directory, name in self.__select_evictions(time.time()):
+            self.__evict(directory, name)
+
+    def __run(self):
+        while not self.__stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.exception(f"Retention sweep failed: {str(e)}")
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__run, name="mobvoi-mcp-retention", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
@@ -0,0 +1,94 @@
+import random
+import threading
+import time
+from typing import Optional
+
+
+class Endpoint:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        # None until the first response, so new endpoints get probed first
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self) -> float:
+        if self.latency is None:
+            # probe new endpoints first, but never prefer one that only ever failed
+            return 0.0 if self.error_rate == 0 else float("inf")
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def to_dict(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "latency": round(self.latency, 4) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "requests": self.requests,
+            "healthy": self.healthy(time.monotonic()),
+        }
+
+
+class EndpointGroup:
+    """Endpoints serving the same service group, ranked by passive EWMA latency and error tracking.
+
+    Every response updates the EWMA latency and error rate of the endpoint it came from.
+    An endpoint failing eject_after times in a row is ejected for eject_seconds, then gets
+    traffic again. Ejected endpoints are still returned last, as a last resort failover.
+
+    Args:
+        base_urls: Base urls of the endpoints.
+        alpha: EWMA smoothing factor, higher values react faster.
+        eject_after: Consecutive failures before an endpoint is ejected.
+        eject_seconds: How long an endpoint stays ejected.
+        explore: Probability of trying a random healthy endpoint first, keeping the stats of slower ones fresh.
+    """
+
+    def __init__(
+        self,
+        base_urls: list[str],
+        alpha: float = 0.3,
+        eject_after: int = 3,
+        eject_seconds: float = 30.0,
+        explore: float = 0.05,
+    ):
+        self.endpoints = [Endpoint(base_url) for base_url in base_urls]
+        self.alpha = alpha
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.explore = explore
+        self.__lock = threading.Lock()
+
+    def ranked(self) -> list[Endpoint]:
+        now = time.monotonic()
+        with self.__lock:
+            healthy = sorted([e for e in self.endpoints if e.healthy(now)], key=lambda e: e.score())
+            ejected = sorted([e for e in self.endpoints if not e.healthy(now)], key=lambda e: e.ejected_until)
+        if len(healthy) > 1 and random.random() < self.explore:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return healthy + ejected
+
+    def report(self, endpoint: Endpoint, latency: Optional[float], ok: bool):
+        with self.__lock:
+            endpoint.requests += 1
+            if latency is not None:
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.alpha * (latency - endpoint.latency)
+            endpoint.error_rate += self.alpha * ((0.0 if ok else 1.0) - endpoint.error_rate)
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+            else:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.eject_after:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def to_list(self) -> list[dict]:
+        with self.__lock:
+            return [endpoint.to_dict() for endpoint in self.endpoints]
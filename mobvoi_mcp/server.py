@@ -1,8 +1,15 @@
 import asyncio
+import concurrent.futures
 import logging
 import os
 import time
 import hashlib
+import uuid
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
 
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP
@@ -14,10 +21,23 @@ from mobvoi_mcp.utils import (
     make_output_file,
     handle_input_file,
     play,
-    speaker_list_filter
+    speaker_list_filter,
+    dumps_compact,
+    to_table
 )
 from mobvoi_mcp.api_client import ApiClient, download_file
 from mobvoi_mcp.utils import LanguageTable
+from mobvoi_mcp.pipeline import AvatarPipeline
+from mobvoi_mcp.tracing import tracer, SpanExporter
+from mobvoi_mcp.profiler import start_profiler
+from mobvoi_mcp.warmup import PhraseBank, Warmup, load_manifest, phrase_key
+from mobvoi_mcp.retention import Quota, RetentionManager
+from mobvoi_mcp.admission import AdmissionController, INTERACTIVE, BULK, remaining_time, submit_in_context
+from mobvoi_mcp.capture import TrafficRecorder
+from mobvoi_mcp.shared_state import LocalStore, RateLimiter, open_shared_store
+from mobvoi_mcp.preflight import Preflight
+from mobvoi_mcp.voice_samples import list_samples, prepare_sample_in_subprocess
+from mobvoi_mcp.dubbing import DubbingError, DubbingSegment, SegmentedDubbing, concat_videos, ffmpeg_available, split_media
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +49,33 @@ app_key = os.getenv("APP_KEY")
 app_secret = os.getenv("APP_SECRET")
 base_path = os.getenv("MOBVOI_MCP_BASE_PATH")
 region = os.getenv("MOBVOI_MCP_REGION")
+default_public_base_url = os.getenv("MOBVOI_MCP_PUBLIC_BASE_URL")
+trace_export = os.getenv("MOBVOI_MCP_TRACE_EXPORT")
+trace_sample_rate = float(os.getenv("MOBVOI_MCP_TRACE_SAMPLE_RATE", "0.1"))
+warmup_enabled = os.getenv("MOBVOI_MCP_WARMUP", "true").lower() not in ["0", "false", "no"]
+warmup_manifest = os.getenv("MOBVOI_MCP_WARMUP_MANIFEST")
+warmup_concurrency = int(os.getenv("MOBVOI_MCP_WARMUP_CONCURRENCY", "4"))
+keepalive_expiry = float(os.getenv("MOBVOI_MCP_KEEPALIVE_EXPIRY", "60"))
+phrase_bank_dir = os.getenv("MOBVOI_MCP_PHRASE_BANK_DIR")
+speaker_cache_ttl = float(os.getenv("MOBVOI_MCP_SPEAKER_CACHE_TTL", "600"))
+state_dir = os.getenv("MOBVOI_MCP_STATE_DIR", "~/.cache/mobvoi-mcp")
+retention_max_bytes = int(os.getenv("MOBVOI_MCP_RETENTION_MAX_BYTES", "0"))
+retention_max_files = int(os.getenv("MOBVOI_MCP_RETENTION_MAX_FILES", "0"))
+retention_max_age = float(os.getenv("MOBVOI_MCP_RETENTION_MAX_AGE", "0"))
+retention_sweep_interval = float(os.getenv("MOBVOI_MCP_RETENTION_SWEEP_INTERVAL", "60"))
+retention_quotas = os.getenv("MOBVOI_MCP_RETENTION_QUOTAS")
+max_concurrency = int(os.getenv("MOBVOI_MCP_MAX_CONCURRENCY", "4"))
+interactive_queue_limit = int(os.getenv("MOBVOI_MCP_INTERACTIVE_QUEUE_LIMIT", "64"))
+bulk_queue_limit = int(os.getenv("MOBVOI_MCP_BULK_QUEUE_LIMIT", "16"))
+default_deadline = float(os.getenv("MOBVOI_MCP_DEFAULT_DEADLINE", "0"))
+capture_file = os.getenv("MOBVOI_MCP_CAPTURE_FILE")
+endpoints = os.getenv("MOBVOI_MCP_ENDPOINTS")
+shared_state_enabled = os.getenv("MOBVOI_MCP_SHARED_STATE", "true").lower() not in ["0", "false", "no"]
+rate_limit = float(os.getenv("MOBVOI_MCP_RATE_LIMIT", "0"))
+rate_limit_burst = float(os.getenv("MOBVOI_MCP_RATE_LIMIT_BURST", "0"))
+tts_cache_ttl = float(os.getenv("MOBVOI_MCP_TTS_CACHE_TTL", "86400"))
+preflight_enabled = os.getenv("MOBVOI_MCP_PREFLIGHT", "true").lower() not in ["0", "false", "no"]
+preflight_limits = os.getenv("MOBVOI_MCP_PREFLIGHT_LIMITS")
 
 logger.info(f"region: {region}")
 logger.info(f"base_path: {base_path}")
@@ -39,24 +86,120 @@ if not app_secret:
     raise ValueError("APP_SECRET environment variable is required")
 if not region:
     region = "mainland"
+if trace_export:
+    logger.info(f"trace_export: {trace_export}, sample rate: {trace_sample_rate}")
+    tracer.configure(trace_sample_rate, SpanExporter(trace_export))
 
 mcp = FastMCP("Mobvoi")
 
-api_client = ApiClient(app_key, app_secret, region)
+recorder = None
+if capture_file:
+    logger.info(f"capture_file: {capture_file}")
+    recorder = TrafficRecorder(capture_file)
+
+# cache and rate limiter state shared by every server process of the machine
+shared_store = open_shared_store(state_dir) if shared_state_enabled else LocalStore()
+# keys are scoped per account, the speaker catalog includes cloned voices and a cloned speaker id may only be valid for its account
+account_id = hashlib.sha1(app_key.encode("utf8")).hexdigest()[:16]
+
+limiter = None
+if rate_limit > 0:
+    logger.info(f"rate_limit: {rate_limit} req/s, burst: {rate_limit_burst or rate_limit}")
+    limiter = RateLimiter(shared_store, f"upstream:{account_id}", rate_limit, rate_limit_burst or rate_limit)
+
+api_client = ApiClient(
+    app_key, app_secret, region,
+    hosts=json.loads(endpoints) if endpoints else None, recorder=recorder, limiter=limiter,
+    keepalive_expiry=keepalive_expiry,
+)
 language_table = LanguageTable()
 
-@mcp.tool(
-    description="""Obtain the list of speaker IDs from Mobvoi sound library and cloned by users themselves.
-    
-    Args:
-        voice_type (str, optional): The type of voices to list. Values range ["all", "system", "voice_cloning"], with "all" being the default.
+preflight = None
+if preflight_enabled:
+    preflight = Preflight(shared_store, limits=json.loads(preflight_limits) if preflight_limits else None)
 
-    Returns:
-        Text content with the list of speaker IDs(include mobvoi_sound_library, user_cloned).
-    """
+# voice samples are prepared in one subprocess each, this pool is shared by all calls to bound the CPU use
+sample_pool = concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+retention = RetentionManager(
+    Path(os.path.expanduser(state_dir)) / "retention.db",
+    Quota(retention_max_bytes, retention_max_files, retention_max_age),
+    sweep_interval=retention_sweep_interval,
 )
-def get_speaker_list(voice_type: str = "all"):
-    logger.info(f"get_speaker_list is called.")
+# per directory overrides, relative directories resolve against the base path like the output_directory of the tools
+for quota_directory, quota in (json.loads(retention_quotas) if retention_quotas else {}).items():
+    quota_directory = os.path.expanduser(quota_directory)
+    if not os.path.isabs(quota_directory) and base_path:
+        quota_directory = os.path.join(os.path.expanduser(base_path), quota_directory)
+    retention.set_quota(quota_directory, Quota(**quota))
+    logger.info(f"retention quota of {quota_directory}: {quota}")
+
+phrase_bank = None
+if phrase_bank_dir or warmup_manifest:
+    phrase_bank = PhraseBank(Path(os.path.expanduser(phrase_bank_dir or os.path.join(state_dir, "phrases"))), retention)
+    logger.info(f"phrase_bank: {phrase_bank.directory}")
+
+def _make_content(response_format: str, text: str, data: dict) -> TextContent:
+    if response_format == "json":
+        return TextContent(type="text", text=dumps_compact(data))
+    return TextContent(type="text", text=text)
+
+def _make_error_content(response_format: str, error: str) -> TextContent:
+    return _make_content(response_format, f"Error: {error}", {"error": error})
+
+admission = AdmissionController(
+    max_concurrency=max_concurrency,
+    queue_limits={INTERACTIVE: interactive_queue_limit, BULK: bulk_queue_limit},
+    default_deadline=default_deadline,
+    reject=lambda error, kwargs: _make_error_content(kwargs.get("response_format", "text"), str(error)),
+)
+
+def _synthesize_speech(
+    output_file: Path,
+    text: str,
+    speaker: str,
+    audio_type: str = "mp3",
+    speed: float = 1.0,
+    rate: int = 24000,
+    volume: float = 1.0,
+    pitch: float = 0.0,
+    streaming: bool = False,
+) -> Path:
+    timestamp = str(int(time.time()))
+    message = '+'.join([app_key, app_secret, timestamp])
+    m = hashlib.md5()
+    m.update(message.encode("utf8"))
+    signature = m.hexdigest()
+    request = {
+        "appkey": app_key,
+        "timestamp": timestamp,
+        "signature": signature,
+        "text": text,
+        "speaker": speaker,
+        "audio_type": audio_type,
+        "speed": speed,
+        "rate": rate,
+        "volume": volume,
+        "pitch": pitch,
+        "streaming": streaming
+    }
+    res = api_client.post("tts.text_to_speech", request)
+    content = res.content
+    if len(content) < 100:
+        logger.error(f"Invalid audio data length: {len(content)}")
+        raise Exception("Failed to get audio data from text to speech service")
+    with tracer.span("tts.write_file", bytes=len(content)):
+        with open(output_file, "wb") as f:
+            f.write(content)
+            logger.info(f"Audio file written: {output_file}")
+    return output_file
+
+def _fetch_speaker_data(refresh: bool = False) -> dict:
+    cache_key = f"speakers:{region}:{account_id}"
+    if not refresh:
+        data = shared_store.get(cache_key)
+        if data is not None:
+            return data
     timestamp = str(int(time.time()))
     message = '+'.join([app_key, app_secret, timestamp])
     m = hashlib.md5()
@@ -67,25 +210,186 @@ def get_speaker_list(voice_type: str = "all"):
         "timestamp": timestamp,
         "signature": signature
     }
+    data = api_client.post("tts.get_speaker_list", request).json()['data']
+    shared_store.set(cache_key, data, speaker_cache_ttl)
+    return data
+
+def _invalidate_speaker_cache():
+    shared_store.delete(f"speakers:{region}:{account_id}")
+
+def _clone_voice(audio_file: str, is_url: bool = False) -> str:
+    timestamp = str(int(time.time()))
+    message = '+'.join([app_key, app_secret, timestamp])
+    m = hashlib.md5()
+    m.update(message.encode("utf8"))
+    signature = m.hexdigest()
+    request = {
+        "appkey": app_key,
+        "timestamp": timestamp,
+        "signature": signature,
+        "wavUri": audio_file if is_url else None
+    }
+    if is_url:
+        res = api_client.post("tts.voice_clone", request={}, data=request)
+    else:
+        logger.info(f"audio file length: {os.path.getsize(audio_file)}")
+        with open(audio_file, "rb") as f:
+            res = api_client.post("tts.voice_clone", request={}, data=request, file={"file": f})
+    return res.json()['speaker']
+
+def _copy_tts_result(phrase: dict, output_file: Path) -> bool:
+    """Copy the output of an identical synthesis done by this or another server process, if it still exists."""
+    entry = shared_store.get(f"tts:{account_id}:{phrase_key(phrase)}")
+    if entry is None:
+        return False
+    previous_file = Path(entry["file"])
     try:
-        res = api_client.post("tts.get_speaker_list", request)
-        systemVoice = res.json()['data']['systemVoice']
-        voiceCloning = res.json()['data']['voiceCloning']
-        galaxy_speakers = speaker_list_filter(systemVoice)
-        output_text = ""
-        if voice_type == "all":
-            output_text = f"Success. Get Speaker list success, systemVoice: {galaxy_speakers}, voiceCloning: {voiceCloning}"
-        elif voice_type == "system":
-            output_text = f"Success. Get Speaker list success, systemVoice: {galaxy_speakers}"
-        elif voice_type == "voice_cloning":
-            output_text = f"Success. Get Speaker list success, voiceCloning: {voiceCloning}"
-        return TextContent(
-            type="text",
-            text=f"Success. Get Speaker list success, {output_text}",
-        )
+        with tracer.span("tts.shared_cache_hit"), retention.in_use(previous_file):
+            if previous_file.stat().st_size != entry["size"]:
+                return False
+            shutil.copyfile(previous_file, output_file)
+    except OSError:
+        # removed by its owner or by a retention sweep in the meantime
+        return False
+    return True
+
+def _copy_phrase_bank(phrase: dict, output_file: Path) -> bool:
+    """Copy the phrase bank entry of the phrase, if the bank holds it."""
+    if phrase_bank is None:
+        return False
+    # pinned before the existence check, the sweeper skips it from there on
+    with retention.in_use(phrase_bank.path_for(phrase)):
+        cached_file = phrase_bank.get(phrase)
+        if cached_file is None:
+            return False
+        try:
+            with tracer.span("tts.phrase_bank_hit"):
+                shutil.copyfile(cached_file, output_file)
+        except OSError:
+            # removed in the meantime by something else than the retention sweep, synthesize again
+            return False
+    return True
+
+def _record_tts_result(phrase: dict, path: Path):
+    shared_store.set(f"tts:{account_id}:{phrase_key(phrase)}", {"file": str(path), "size": path.stat().st_size}, tts_cache_ttl)
+
+def _synthesize_phrase(output_file: Path, phrase: dict) -> Path:
+    return _synthesize_speech(
+        output_file,
+        phrase["text"],
+        phrase.get("speaker", "xiaoyi_meet_24k"),
+        phrase.get("audio_type", "mp3"),
+        phrase.get("speed", 1.0),
+        phrase.get("rate", 24000),
+        phrase.get("volume", 1.0),
+        phrase.get("pitch", 0.0),
+    )
+
+def _download_result(result_url: str, output_dir: str, task_id: str) -> str:
+    output_path = os.path.join(output_dir, f"{task_id}.mp4")
+    os.makedirs(output_dir, exist_ok=True)
+    with retention.writing(output_path):
+        download_file(result_url, output_path)
+    return output_path
+
+def _submit_video_dubbing(video_url: str, audio_url: str) -> str:
+    request = {
+        "videoUrl": video_url,
+        "wavUrl": audio_url
+    }
+    res = api_client.post("avatar.video_dubbing", request).json()
+    logger.info(f"video_dubbing response: {res}")
+    if res is None:
+        raise Exception("Failed to call video dubbing service")
+    task_id = res.get("data", None)
+    if task_id is None:
+        raise Exception("Failed to get task id")
+    return task_id
+
+def _query_video_dubbing(task_id: str) -> dict:
+    task_id_req = {
+        "taskId": task_id,
+        "taskUuid": task_id
+    }
+    header = {"Content-Type": "application/json"}
+    response = api_client.get("avatar.query_video_dubbing", request=task_id_req, headers=header).json()
+    res = response.get("data", None)
+    logger.info(f"query_video_dubbing response: {res}")
+    if res is None:
+        raise Exception("Failed to query video dubbing result.")
+    return res
+
+def _preflight(items: list[tuple[str, str]], limits: bool = True, max_age: Optional[float] = None):
+    """Fail fast on media urls the avatar service would reject minutes later, raises PreflightError."""
+    if preflight is not None:
+        preflight.validate(items, limits, max_age)
+
+def _submit_photo_drive_avatar(image_url: str, audio_url: str) -> str:
+    request = {
+        "imageUrl": image_url,
+        "audioUrl": audio_url
+    }
+    res = api_client.post("avatar.photo_drive_avatar", request).json()
+    if res is None:
+        raise Exception("Failed to call photo drive avatar service")
+    task_id = res.get("data", None)
+    if task_id is None:
+        raise Exception("Failed to get task id")
+    return task_id
+
+def _query_photo_drive_avatar(task_id: str) -> dict:
+    response = api_client.get("avatar.query_photo_drive_avatar", path=task_id).json()
+    res = response.get("data", None)
+    logger.info(f"query_photo_drive_avatar response: {res}")
+    if res is None:
+        raise Exception("Failed to call photo drive avatar result service")
+    return res
+
+@mcp.tool(
+    description="""Obtain the list of speaker IDs from Mobvoi sound library and cloned by users themselves.
+    
+    Args:
+        voice_type (str, optional): The type of voices to list. Values range ["all", "system", "voice_cloning"], with "all" being the default.
+        response_format (str, optional): "json" (default) for a compact table per voice type: {"columns": [...], "rows": [[...]], "total": N, "offset": N, "next_offset": N},
+            or "text" for a list of speaker dicts.
+        fields (list, optional): Only return these fields, e.g. ["name", "speakerID"]. All fields are returned if empty.
+        offset (int, optional): Index of the first speaker to return, default is 0.
+        limit (int, optional): Maximum number of speakers to return per voice type, 0 (default) means no limit.
+            Use next_offset of the previous page as offset to get the next page.
+
+    Returns:
+        Content with the list of speaker IDs(include mobvoi_sound_library, user_cloned).
+    """
+)
+@admission.admit(INTERACTIVE)
+@tracer.wrap()
+def get_speaker_list(
+    voice_type: str = "all",
+    response_format: str = "json",
+    fields: Optional[list[str]] = None,
+    offset: int = 0,
+    limit: int = 0,
+):
+    logger.info(f"get_speaker_list is called.")
+    try:
+        res = _fetch_speaker_data()
+        systemVoice = res['systemVoice']
+        voiceCloning = res['voiceCloning']
+        data = {}
+        if voice_type in ["all", "system"]:
+            data["systemVoice"] = to_table(speaker_list_filter(systemVoice), fields, offset, limit)
+        if voice_type in ["all", "voice_cloning"]:
+            data["voiceCloning"] = to_table(voiceCloning, fields, offset, limit)
+        if not data:
+            raise Exception(f"Unknown voice type: {voice_type}")
+        output_text = ", ".join([
+            f"{name}: {[dict(zip(table['columns'], row)) for row in table['rows']]}"
+            for name, table in data.items()
+        ])
+        return _make_content(response_format, f"Success. Get Speaker list success, {output_text}", data)
     except Exception as e:
         logger.exception(f"Error in get_speaker_list: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
 
 @mcp.tool(
     description="""The text_to_speech service of Mobvoi. Convert text to speech with a given speaker and save the output audio file to a given directory.
@@ -105,11 +409,14 @@ def get_speaker_list(voice_type: str = "all"):
         streaming(bool): Whether to output in a streaming manner. The default value is false.
         output_directory (str): Directory where files should be saved.
             Defaults to $HOME/Desktop if not provided.
+        response_format (str): "text" (default) or "json" for a compact JSON object {"file": ..., "speaker": ...}.
 
     Returns:
         Text content with the path to the output file and name of the speaker used.
     """
 )
+@admission.admit(BULK)
+@tracer.wrap()
 def text_to_speech(
     text: str,
     speaker: str = "xiaoyi_meet_24k",
@@ -120,51 +427,34 @@ def text_to_speech(
     pitch: float = 0.0,
     streaming: bool = False,
     output_directory: str = "",
+    response_format: str = "text",
 ):
     logger.info(f"text_to_speech is called.")
     
     if text == "":
-        return TextContent(type="text", text="Error: Text is required.")
+        return _make_error_content(response_format, "Text is required.")
     
-    output_path = make_output_path(output_directory, base_path)
-    output_file_name = make_output_file("tts", speaker, output_path, "mp3")
-    
-    timestamp = str(int(time.time()))
-    message = '+'.join([app_key, app_secret, timestamp])
-    m = hashlib.md5()
-    m.update(message.encode("utf8"))
-    signature = m.hexdigest()
-    request = {
-        "appkey": app_key,
-        "timestamp": timestamp,
-        "signature": signature,
-        "text": text,
-        "speaker": speaker,
-        "audio_type": audio_type,
-        "speed": speed,
-        "rate": rate,
-        "volume": volume,
-        "pitch": pitch,
-        "streaming": streaming
-    }
     try:
-        res = api_client.post("tts.text_to_speech", request)
-        content = res.content
-        if len(content) < 100:
-            logger.error(f"Invalid audio data length: {len(content)}")
-            raise Exception("Failed to get audio data from text to speech service")
-        else:
-            with open(output_path / output_file_name, "wb") as f:
-                f.write(content)
-                logger.info(f"Audio file written: {output_path / output_file_name}")
-            return TextContent(
-                type="text",
-                text=f"Success. File saved as: {output_path / output_file_name}. Speaker used: {speaker}",
-            )
-            
+        output_path = make_output_path(output_directory, base_path)
+        output_file_name = make_output_file("tts", speaker, output_path, "mp3")
+        phrase = {"text": text, "speaker": speaker, "audio_type": audio_type, "speed": speed, "rate": rate, "volume": volume, "pitch": pitch}
+        with retention.writing(output_file_name):
+            if not streaming and _copy_phrase_bank(phrase, output_file_name):
+                logger.info(f"Audio file copied from phrase bank: {output_file_name}")
+            elif not streaming and _copy_tts_result(phrase, output_file_name):
+                logger.info(f"Audio file copied from previous synthesis: {output_file_name}")
+            else:
+                _synthesize_speech(output_file_name, text, speaker, audio_type, speed, rate, volume, pitch, streaming)
+                if not streaming:
+                    _record_tts_result(phrase, Path(output_file_name))
+        return _make_content(
+            response_format,
+            f"Success. File saved as: {output_file_name}. Speaker used: {speaker}",
+            {"file": str(output_file_name), "speaker": speaker},
+        )
     except Exception as e:
         logger.exception(f"Error in text_to_speech: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
 
 @mcp.tool(
     description="""The voice_clone service of Mobvoi. Clone a voice from a given url or local audio file. This tool will return a speaker id which can be used in text_to_speech tool.
@@ -174,38 +464,127 @@ def text_to_speech(
     Args:
         is_url (bool): Whether the audio file is a url.
         audio_file (str): The path or url of the audio file to clone.
+        response_format (str): "text" (default) or "json" for a compact JSON object {"speaker": ...}.
     """
 )
-def voice_clone(is_url: bool, audio_file: str):
+@admission.admit(BULK)
+@tracer.wrap()
+def voice_clone(is_url: bool, audio_file: str, response_format: str = "text"):
     logger.info(f"voice_clone is called.")
     
-    timestamp = str(int(time.time()))
-    message = '+'.join([app_key, app_secret, timestamp])
-    m = hashlib.md5()
-    m.update(message.encode("utf8"))
-    signature = m.hexdigest()
-    request = {
-        "appkey": app_key,
-        "timestamp": timestamp,
-        "signature": signature,
-        "wavUri": audio_file if is_url else None
-    }
-    files = {
-        'file': open(audio_file, 'rb')
-    } if not is_url else None
-    logger.info(f"audio file length: {len(files['file'].read())}")
     try:
-        res = api_client.post("tts.voice_clone", request={}, data=request, file=files)
-        return TextContent(type="text", text=f"Success. Speaker id: {res.json()['speaker']}")
+        speaker_id = _clone_voice(audio_file, is_url)
+        _invalidate_speaker_cache()
+        return _make_content(response_format, f"Success. Speaker id: {speaker_id}", {"speaker": speaker_id})
     except Exception as e:
         logger.exception(f"Error in voice_clone: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+@mcp.tool(
+    description="""Clone many voices in one call, e.g. to onboard a catalog of voices. Every sample is prepared locally before the upload:
+    decoded, trimmed of leading and trailing silence, downmixed to mono, resampled and compressed, which cuts the uploaded bytes.
+    Samples are prepared in parallel worker processes and uploaded as soon as they are ready, a few at a time.
+    It returns a manifest mapping each file to its speaker id, which can be used in the text_to_speech tool.
+
+    ⚠️ COST WARNING: This tool makes one API call to Mobvoi TTS service per sample, which may incur costs. Only use when explicitly requested by the user.
+
+    Args:
+        audio_files: Paths of the local samples, a directory stands for the audio files it contains (wav, mp3, flac, ogg, aiff).
+        sample_rate: Sample rate of the uploaded samples, default is 24000.
+        audio_format: Format of the uploaded samples, "mp3" (default) or "wav" (16 bit PCM).
+        max_uploads: Number of uploads running at the same time, default is 4.
+        manifest_file: If given, the manifest {file: speaker id} is also written to this JSON file.
+        response_format: "text" (default) or "json" for a compact JSON object {"succeeded": N, "manifest": {file: speaker}, "errors": {file: error}, ...}.
+
+    Returns:
+        A text message with the speaker id or the error of each file.
+    """
+)
+@admission.admit(BULK)
+@tracer.wrap()
+def batch_voice_clone(
+    audio_files: list[str],
+    sample_rate: int = 24000,
+    audio_format: str = "mp3",
+    max_uploads: int = 4,
+    manifest_file: str = "",
+    response_format: str = "text",
+):
+    logger.info(f"batch_voice_clone is called.")
+
+    if audio_format not in ["mp3", "wav"]:
+        return _make_error_content(response_format, "audio_format must be mp3 or wav.")
+    samples = [str(sample) for sample in list_samples(audio_files)]
+    if not samples:
+        return _make_error_content(response_format, "No audio file found.")
 
-@mcp.tool(description="Play an audio file. Supports WAV and MP3 formats.")
-def play_audio(input_file_path: str) -> TextContent:
+    start = time.perf_counter()
+    manifest = {sample: None for sample in samples}
+    errors = {}
+    original_bytes, uploaded_bytes = 0, 0
+    upload_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(max_uploads, 1))
+    try:
+        with tempfile.TemporaryDirectory(prefix="mobvoi-mcp-clone-") as prepared_dir, upload_pool:
+            prepare_futures = {
+                sample_pool.submit(prepare_sample_in_subprocess, sample, prepared_dir, sample_rate, audio_format, remaining_time()): sample
+                for sample in samples
+            }
+            upload_futures = {}
+            # uploads start as soon as a sample is ready, while the others are still being prepared
+            for future in concurrent.futures.as_completed(prepare_futures):
+                sample = prepare_futures[future]
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    errors[sample] = f"Preparation failed: {str(e)}"
+                    continue
+                original_bytes += prepared["original_bytes"]
+                uploaded_bytes += prepared["prepared_bytes"]
+                upload_futures[submit_in_context(upload_pool, _clone_voice, prepared["prepared_file"])] = sample
+            for future in concurrent.futures.as_completed(upload_futures):
+                sample = upload_futures[future]
+                try:
+                    manifest[sample] = future.result()
+                except Exception as e:
+                    errors[sample] = f"Upload failed: {str(e)}"
+        if any(manifest.values()):
+            _invalidate_speaker_cache()
+        if manifest_file:
+            manifest_path = Path(os.path.expanduser(manifest_file))
+            manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(manifest_path, "w", encoding="utf8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception(f"Error in batch_voice_clone: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+    succeeded = len([speaker for speaker in manifest.values() if speaker])
+    elapsed = time.perf_counter() - start
+    lines = [
+        f"Cloned {succeeded}/{len(samples)} voices in {elapsed:.1f}s, uploaded {uploaded_bytes} bytes for {original_bytes} bytes of samples."
+    ]
+    for sample in samples:
+        lines.append(f"{sample}: {manifest[sample]}" if manifest[sample] else f"{sample}: Error: {errors[sample]}")
+    return _make_content(
+        response_format,
+        "\n".join(lines),
+        {
+            "succeeded": succeeded,
+            "manifest": manifest,
+            "errors": errors,
+            "original_bytes": original_bytes,
+            "uploaded_bytes": uploaded_bytes,
+            "elapsed": round(elapsed, 3),
+        },
+    )
+
+@mcp.tool(description="Play an audio file. Supports WAV and MP3 formats. Set response_format to \"json\" for a compact JSON object {\"file\": ...}.")
+@admission.admit(BULK)
+@tracer.wrap()
+def play_audio(input_file_path: str, response_format: str = "text") -> TextContent:
     file_path = handle_input_file(input_file_path)
     play(open(file_path, "rb").read(), use_ffmpeg=False)
-    return TextContent(type="text", text=f"Successfully played audio file: {file_path}")
+    return _make_content(response_format, f"Successfully played audio file: {file_path}", {"file": str(file_path)})
 
 
 @mcp.tool(
@@ -213,36 +592,32 @@ def play_audio(input_file_path: str) -> TextContent:
     It will consume some time to generate the video, wait with patience.
     It will return a text message indicating that the task is submitted successfully, task id will be returned.
     After getting the task id, you may use the query_photo_drive_avatar tool to query the result of the task.
+    The urls are checked before submission (reachable, media type, size and duration), an invalid url fails immediately with the reason.
     
     ⚠️ COST WARNING: This tool makes an API call to Mobvoi which may incur costs. Only use when explicitly requested by the user.
 
     Args:
         image_url: The URL of the image to use in the video.
         audio_url: The URL of the audio to use in the video.
+        response_format: "text" (default) or "json" for a compact JSON object {"task_id": ...}.
 
     Returns:
         A text message indicating the success of the video generation task, task id will be returned if success.
     """
 )
-def photo_drive_avatar(image_url: str, audio_url: str):
+@admission.admit(BULK)
+@tracer.wrap()
+def photo_drive_avatar(image_url: str, audio_url: str, response_format: str = "text"):
     logger.info(f"photo_drive_avatar is called.")
 
-    request = {
-        "imageUrl": image_url,
-        "audioUrl": audio_url
-    }
     try:
-        res = api_client.post("avatar.photo_drive_avatar", request).json()
-        if res is None:
-            raise Exception("Failed to call photo drive avatar service")
-        task_id = res.get("data", None)
-        if task_id is None:
-            raise Exception("Failed to get task id")
+        _preflight([(image_url, "image"), (audio_url, "audio")])
+        task_id = _submit_photo_drive_avatar(image_url, audio_url)
     except Exception as e:
         logger.exception(f"Error in photo_drive_avatar: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
     
-    return TextContent(type="text", text=f"Success. Task id: {task_id}")
+    return _make_content(response_format, f"Success. Task id: {task_id}", {"task_id": task_id})
 
 @mcp.tool(
     description="""Query the result of the photo drive avatar task.
@@ -255,37 +630,143 @@ def photo_drive_avatar(image_url: str, audio_url: str):
         task_id: The task id of the photo drive avatar task.
         output_dir: The directory to save the generated video, you can send the absolute path of the current working directory.
                     The result will be saved into $output_dir/$task_id/result.mp4.
+        response_format: "text" (default) or "json" for a compact JSON object {"task_id": ..., "status": ..., "result_url": ..., "output_path": ...}.
 
     Returns:
         A text message indicating the status of the task.
         Result url will be returned if success, saved path will be returned if output directory is specified.
     """
 )
-def query_photo_drive_avatar(task_id: str, output_dir: str = ""):
+@admission.admit(INTERACTIVE)
+@tracer.wrap()
+def query_photo_drive_avatar(task_id: str, output_dir: str = "", response_format: str = "text"):
     logger.info(f"query_photo_drive_avatar is called.")
     try:
-        response = api_client.get("avatar.query_photo_drive_avatar", path=task_id).json()
-        res = response.get("data", None)
-        logger.info(f"query_photo_drive_avatar response: {res}")
-        if res is None:
-            raise Exception("Failed to call photo drive avatar result service")
+        res = _query_photo_drive_avatar(task_id)
         status = res.get("status", None)
         if status == "suc":
             result_url = res.get("resultUrl", None)
             if output_dir != "":
-                output_path = os.path.join(output_dir, f"{task_id}.mp4")
-                os.makedirs(output_dir, exist_ok=True)
-                download_file(result_url, output_path)
-                return TextContent(type="text", text=f"Success. Result url: {result_url}. Result saved as: {output_path}")
+                output_path = _download_result(result_url, output_dir, task_id)
+                return _make_content(
+                    response_format,
+                    f"Success. Result url: {result_url}. Result saved as: {output_path}",
+                    {"task_id": task_id, "status": status, "result_url": result_url, "output_path": output_path},
+                )
             else:
-                return TextContent(type="text", text=f"Success. Result url: {result_url}")
+                return _make_content(
+                    response_format,
+                    f"Success. Result url: {result_url}",
+                    {"task_id": task_id, "status": status, "result_url": result_url},
+                )
         elif status == "ing":
-            return TextContent(type="text", text=f"Task {task_id} is still running, please wait for a while.")
+            return _make_content(
+                response_format,
+                f"Task {task_id} is still running, please wait for a while.",
+                {"task_id": task_id, "status": status},
+            )
         else:
             raise Exception(f"Task {task_id} failed with status: {status}, message: {res.get('msg', 'Unknown error')}")
     except Exception as e:
         logger.exception(f"Error in query_photo_drive_avatar: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+@mcp.tool(
+    description="""End-to-end text to talking head video pipeline. For each text, it synthesizes speech with the given speaker,
+    publishes the audio under a public base url, submits a photo drive avatar task with the given image, waits for the render and downloads the video.
+    Several texts are processed concurrently, so the synthesis of the next video overlaps with the rendering of the previous one.
+    It replaces the text_to_speech -> photo_drive_avatar -> query_photo_drive_avatar chain in a single call, wait with patience.
+
+    ⚠️ COST WARNING: This tool makes API calls to Mobvoi TTS and avatar services which may incur costs. Only use when explicitly requested by the user.
+
+    Args:
+        texts: The list of texts, one video is generated per text.
+        image_url: The URL of the image to use in the videos.
+        speaker: The speaker used to synthesize the audio, default is xiaoyi_meet_24k.
+        output_directory: Directory where the synthesized audio is written. It must be served under public_base_url.
+            Defaults to $HOME/Desktop if not provided.
+        public_base_url: Public URL prefix under which the files of output_directory can be fetched by the avatar service.
+            Defaults to the MOBVOI_MCP_PUBLIC_BASE_URL environment variable.
+        output_dir: The directory to save the generated videos, as $output_dir/$task_id.mp4. If empty, only result urls are returned.
+        poll_interval: Seconds between two status queries of a render task, default is 5.
+        timeout: Maximum seconds to wait for one video to render, default is 600.
+        response_format: "text" (default) or "json" for a compact JSON object {"succeeded": N, "jobs": [...]}.
+
+    Returns:
+        A text message with, for each text, the task id, result url, saved path and per-stage timings in seconds.
+    """
+)
+@admission.admit(BULK)
+@tracer.wrap()
+def text_to_avatar(
+    texts: list[str],
+    image_url: str,
+    speaker: str = "xiaoyi_meet_24k",
+    output_directory: str = "",
+    public_base_url: str = "",
+    output_dir: str = "",
+    poll_interval: float = 5.0,
+    timeout: float = 600.0,
+    response_format: str = "text",
+):
+    logger.info(f"text_to_avatar is called.")
+
+    texts = [text for text in texts if text.strip()]
+    if not texts:
+        return _make_error_content(response_format, "Text is required.")
+    audio_base_url = public_base_url or default_public_base_url
+    if not audio_base_url:
+        return _make_error_content(response_format, "public_base_url or MOBVOI_MCP_PUBLIC_BASE_URL is required to publish the synthesized audio.")
+
+    try:
+        output_path = make_output_path(output_directory, base_path)
+        _preflight([(image_url, "image")])
+    except Exception as e:
+        logger.exception(f"Error in text_to_avatar: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+    def synthesize(text: str) -> Path:
+        text_id = hashlib.md5(text.encode("utf8")).hexdigest()[:8]
+        # the timestamp has a one second resolution, identical texts of one call (or of concurrent calls) need their own file
+        output_file = make_output_file("avatar_tts", f"{speaker}_{text_id}_{uuid.uuid4().hex[:8]}", output_path, "mp3")
+        with retention.writing(output_file):
+            return _synthesize_speech(output_file, text, speaker)
+
+    def publish(audio_path: Path) -> str:
+        return f"{audio_base_url.rstrip('/')}/{audio_path.relative_to(output_path).as_posix()}"
+
+    def submit(audio_url: str) -> str:
+        # also catches a public_base_url that does not serve output_directory
+        _preflight([(image_url, "image"), (audio_url, "audio")])
+        return _submit_photo_drive_avatar(image_url, audio_url)
+
+    def query(task_id: str) -> tuple:
+        res = _query_photo_drive_avatar(task_id)
+        return res.get("status", None), res.get("resultUrl", None), res.get("msg", "Unknown error")
+
+    def download(task_id: str, result_url: str):
+        if output_dir == "":
+            return None
+        return _download_result(result_url, output_dir, task_id)
+
+    pipeline = AvatarPipeline(synthesize, publish, submit, query, download, poll_interval=poll_interval, timeout=timeout)
+    jobs = pipeline.run(texts)
+
+    lines = []
+    for job in jobs:
+        timings = ", ".join([f"{stage}={seconds:.2f}s" for stage, seconds in job.timings.items()])
+        if job.error:
+            lines.append(f"[{job.index}] Error: {job.error}. Timings: {timings}")
+        else:
+            saved = f" Result saved as: {job.output_path}." if job.output_path else ""
+            lines.append(f"[{job.index}] Success. Task id: {job.task_id}. Result url: {job.result_url}.{saved} Timings: {timings}")
+    succeeded = len([job for job in jobs if not job.error])
+    summary = f"Finished {succeeded}/{len(jobs)} videos."
+    return _make_content(
+        response_format,
+        "\n".join([summary] + lines),
+        {"succeeded": succeeded, "jobs": [job.to_dict() for job in jobs]},
+    )
 
 @mcp.tool(
     description="""This tool aims to perform the voice over task, which generates a video from a given video URL and an audio URL.
@@ -293,38 +774,32 @@ def query_photo_drive_avatar(task_id: str, output_dir: str = ""):
     It will consume some time to generate the video, wait with patience.
     It will return a text message indicating that the task is submitted successfully, task id will be returned.
     After getting the task id, you may use the query_video_dubbing tool to query the result of the task.
+    The urls are checked before submission (reachable, media type, size and duration), an invalid url fails immediately with the reason.
 
     ⚠️ COST WARNING: This tool makes an API call to Mobvoi which may incur costs. Only use when explicitly requested by the user.
 
     Args:
         video_url: The URL of the video to use as the base.
         audio_url: The URL of the audio to use in the video.
+        response_format: "text" (default) or "json" for a compact JSON object {"task_id": ...}.
 
     Returns:
         A text message indicating the success of the video generation task.
     """
 )
-def video_dubbing(video_url: str, audio_url: str):
+@admission.admit(BULK)
+@tracer.wrap()
+def video_dubbing(video_url: str, audio_url: str, response_format: str = "text"):
     logger.info(f"video_dubbing is called.")
 
-    request = {
-        "videoUrl": video_url,
-        "wavUrl": audio_url
-    }
-
     try:
-        res = api_client.post("avatar.video_dubbing", request).json()
-        logger.info(f"video_dubbing response: {res}")
-        if res is None:
-            raise Exception("Failed to call video dubbing service")
-        task_id = res.get("data", None)
-        if task_id is None:
-            raise Exception("Failed to get task id")
+        _preflight([(video_url, "video"), (audio_url, "audio")])
+        task_id = _submit_video_dubbing(video_url, audio_url)
     except Exception as e:
         logger.exception(f"Error in video_dubbing: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
     
-    return TextContent(type="text", text=f"Success. Task id: {task_id}")
+    return _make_content(response_format, f"Success. Task id: {task_id}", {"task_id": task_id})
 
 @mcp.tool(
     description="""Query the result of the video dubbing task.
@@ -337,45 +812,173 @@ def video_dubbing(video_url: str, audio_url: str):
         task_id: The task id of the video dubbing task.
         output_dir: The directory to save the generated video, you can send the absolute path of the current working directory.
                     The result will be saved into $output_dir/$task_id/result.mp4.
+        response_format: "text" (default) or "json" for a compact JSON object {"task_id": ..., "status": ..., "result_url": ..., "output_path": ...}.
 
     Returns:
         A text message indicating the status of the task.
         Result url will be returned if success, saved path will be returned if output directory is specified.
 """
 )
-def query_video_dubbing(task_id: str, output_dir: str = ""):
+@admission.admit(INTERACTIVE)
+@tracer.wrap()
+def query_video_dubbing(task_id: str, output_dir: str = "", response_format: str = "text"):
     logger.info(f"query_video_dubbing is called.")
 
-    task_id_req = {
-        "taskId": task_id,
-        "taskUuid": task_id
-    }
-
-    header = {"Content-Type": "application/json"}
-
     try:
-        response = api_client.get("avatar.query_video_dubbing", request=task_id_req, headers=header).json()
-        res = response.get("data", None)
-        logger.info(f"query_video_dubbing response: {res}")
-        if res is None:
-            raise Exception("Failed to query video dubbing result.")
+        res = _query_video_dubbing(task_id)
         status = res.get("status", None)
         if status == "suc":
             result_url = res.get("resultUrl", None)
             if output_dir != "":
-                output_path = os.path.join(output_dir, f"{task_id}.mp4")
-                os.makedirs(output_dir, exist_ok=True)
-                download_file(result_url, output_path)
-                return TextContent(type="text", text=f"Success. Result url: {result_url}. Result saved as: {output_path}")
+                output_path = _download_result(result_url, output_dir, task_id)
+                return _make_content(
+                    response_format,
+                    f"Success. Result url: {result_url}. Result saved as: {output_path}",
+                    {"task_id": task_id, "status": status, "result_url": result_url, "output_path": output_path},
+                )
             else:
-                return TextContent(type="text", text=f"Success. Result url: {result_url}")
+                return _make_content(
+                    response_format,
+                    f"Success. Result url: {result_url}",
+                    {"task_id": task_id, "status": status, "result_url": result_url},
+                )
         elif status == "ing":
-            return TextContent(type="text", text=f"Task {task_id} is still running, please wait for a while.")
+            return _make_content(
+                response_format,
+                f"Task {task_id} is still running, please wait for a while.",
+                {"task_id": task_id, "status": status},
+            )
         else:
             raise Exception(f"Task {task_id} failed with status: {status}, message: {res.get('msg', 'Unknown error')}")
     except Exception as e:
         logger.exception(f"Error in query_video_dubbing: {str(e)}")
-        return TextContent(type="text", text=f"Error: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+@mcp.tool(
+    description="""Segmented video dubbing for long videos. The video and the audio are downloaded, split locally at the same timestamps,
+    the segments are dubbed as parallel tasks and the results are joined without re-encoding into a single mp4, so a long video renders
+    in about the time of one segment. Failed segments are submitted again, without redoing the others.
+    It replaces the video_dubbing -> query_video_dubbing chain in a single call, wait with patience.
+    Splitting requires ffmpeg and a public_base_url serving output_directory; without them the video is dubbed as a single task.
+
+    ⚠️ COST WARNING: This tool makes API calls to Mobvoi which may incur costs. Only use when explicitly requested by the user.
+
+    Args:
+        video_url: The URL of the video to use as the base.
+        audio_url: The URL of the audio to use in the video, it should last as long as the video.
+        output_directory: Directory where the segments and the final video are written. The segments must be served under public_base_url.
+            Defaults to $HOME/Desktop if not provided.
+        public_base_url: Public URL prefix under which the files of output_directory can be fetched by the dubbing service.
+            Defaults to the MOBVOI_MCP_PUBLIC_BASE_URL environment variable.
+        segment_seconds: Target duration of a segment, default is 120. Cuts are made on the next keyframe.
+        max_parallel: Number of segments rendered at the same time, default is 4.
+        retries: Number of times a failed segment is submitted again, default is 2.
+        poll_interval: Seconds between two status queries of a segment task, default is 5.
+        timeout: Maximum seconds to wait for one segment to render, default is 1800.
+        response_format: "text" (default) or "json" for a compact JSON object {"output_path": ..., "segments": [...]}.
+
+    Returns:
+        A text message with the saved path of the dubbed video, or the segments that failed.
+    """
+)
+@admission.admit(BULK)
+@tracer.wrap()
+def segmented_video_dubbing(
+    video_url: str,
+    audio_url: str,
+    output_directory: str = "",
+    public_base_url: str = "",
+    segment_seconds: float = 120.0,
+    max_parallel: int = 4,
+    retries: int = 2,
+    poll_interval: float = 5.0,
+    timeout: float = 1800.0,
+    response_format: str = "text",
+):
+    logger.info(f"segmented_video_dubbing is called.")
+
+    segment_base_url = public_base_url or default_public_base_url
+    try:
+        output_path = make_output_path(output_directory, base_path)
+        # the sources are split before submission, the per task limits apply to the segments
+        _preflight([(video_url, "video"), (audio_url, "audio")], limits=False)
+    except Exception as e:
+        logger.exception(f"Error in segmented_video_dubbing: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+    job_id = hashlib.md5(f"{video_url}\n{audio_url}".encode("utf8")).hexdigest()[:8]
+    output_file = make_output_file("dubbing", job_id, output_path, "mp4")
+    work_dir = output_path / f"{output_file.stem}_segments"
+    note = None
+    if not ffmpeg_available():
+        note = "not segmented, ffmpeg is not installed"
+    elif not segment_base_url:
+        note = "not segmented, public_base_url or MOBVOI_MCP_PUBLIC_BASE_URL is required to publish the segments"
+
+    def publish(path: Path) -> str:
+        return f"{segment_base_url.rstrip('/')}/{path.relative_to(output_path).as_posix()}"
+
+    def submit(segment_video_url: str, segment_audio_url: str) -> str:
+        # the segments were just published, a failure cached by an earlier attempt is not reused
+        _preflight([(segment_video_url, "video"), (segment_audio_url, "audio")], max_age=0)
+        return _submit_video_dubbing(segment_video_url, segment_audio_url)
+
+    def query(task_id: str) -> tuple:
+        res = _query_video_dubbing(task_id)
+        return res.get("status", None), res.get("resultUrl", None), res.get("msg", "Unknown error")
+
+    def download(segment: DubbingSegment, result_url: str) -> Path:
+        if note is not None:
+            with retention.writing(output_file):
+                download_file(result_url, str(output_file))
+            return output_file
+        segment_file = work_dir / f"result_{segment.index:04d}.mp4"
+        download_file(result_url, str(segment_file))
+        return segment_file
+
+    try:
+        if note is not None:
+            segments = [DubbingSegment(0, video_url, audio_url)]
+        else:
+            with tracer.span("dubbing.split"):
+                source_dir = work_dir / "source"
+                source_dir.mkdir(parents=True, exist_ok=True)
+                download_file(video_url, str(source_dir / "video"))
+                download_file(audio_url, str(source_dir / "audio"))
+                parts = split_media(source_dir / "video", source_dir / "audio", segment_seconds, work_dir)
+            segments = [
+                DubbingSegment(i, publish(video_part), publish(audio_part), start, end)
+                for i, (video_part, audio_part, start, end) in enumerate(parts)
+            ]
+        logger.info(f"segmented_video_dubbing: {len(segments)} segments")
+
+        dubbing = SegmentedDubbing(
+            submit, query, download,
+            poll_interval=poll_interval, timeout=timeout, max_workers=max_parallel, retries=retries,
+        )
+        dubbing.run(segments)
+        failed = [segment for segment in segments if segment.error]
+        if failed:
+            errors = "; ".join([f"[{segment.index}] {segment.error}" for segment in failed])
+            raise DubbingError(f"{len(failed)}/{len(segments)} segments failed after {retries} retries: {errors}")
+        if note is None:
+            with tracer.span("dubbing.concat", segments=len(segments)), retention.writing(output_file):
+                concat_videos([segment.output_path for segment in segments], output_file)
+    except Exception as e:
+        logger.exception(f"Error in segmented_video_dubbing: {str(e)}")
+        return _make_error_content(response_format, str(e))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    retried = len([segment for segment in segments if segment.attempts > 1])
+    text = f"Success. Result saved as: {output_file}. Segments: {len(segments)}, retried: {retried}."
+    if note is not None:
+        text += f" Note: {note}."
+    return _make_content(
+        response_format,
+        text,
+        {"output_path": str(output_file), "note": note, "segments": [segment.to_dict() for segment in segments]},
+    )
 
 @mcp.tool(
     description="""Get a list of supported languages for video translation.
@@ -389,20 +992,127 @@ def query_video_dubbing(task_id: str, output_dir: str = ""):
     * The third column is whether the language can be used as source language.
     * The fourth column is whether the language can be used as target language.
 
+    Args:
+        response_format: "text" (default) for the format above, or "json" for a compact table:
+            {"columns": ["name", "code", "is_src", "is_target"], "rows": [[...]], "total": N, "offset": N, "next_offset": N}.
+        offset: Index of the first language to return, default is 0.
+        limit: Maximum number of languages to return, 0 (default) means no limit.
+
     Returns:
         A text message indicating the information of supported languages for video translation
 
     """
 )
-def video_translate_language_list():
+@admission.admit(INTERACTIVE)
+@tracer.wrap()
+def video_translate_language_list(response_format: str = "text", offset: int = 0, limit: int = 0):
     logger.info(f"video_translate_language_list is called.")
-    language_list = language_table.get_language_list()
-    language_list_str = "\n".join([f"{language.name} ({language.code}), {language.is_src}, {language.is_target}" for language in language_list])
-    return TextContent(type="text", text=language_list_str)
+    language_list = [
+        {"name": language.name, "code": language.code, "is_src": language.is_src, "is_target": language.is_target}
+        for language in language_table.get_language_list()
+    ]
+    table = to_table(language_list, offset=offset, limit=limit)
+    language_list_str = "\n".join([f"{name} ({code}), {is_src}, {is_target}" for name, code, is_src, is_target in table["rows"]])
+    return _make_content(response_format, language_list_str, table)
+
+@mcp.tool(
+    description="""Admin tool. Start a sampling profiler in the background for a number of seconds, then dump the sampled stacks of all server threads
+    in the folded stack format, ready for flamegraph.pl, speedscope or inferno. The tool returns immediately, the file is written when the profiling ends.
+
+    Args:
+        duration_seconds: How long to profile, default is 30 seconds, at most 600.
+        interval_ms: Sampling interval in milliseconds, default is 10.
+        output_file: Path of the folded stack file. Defaults to $MOBVOI_MCP_BASE_PATH (or $HOME/Desktop)/profile_<timestamp>.folded.
+        response_format: "text" (default) or "json" for a compact JSON object {"file": ..., "duration": ...}.
+
+    Returns:
+        A text message with the path the profile will be written to.
+    """
+)
+def start_sampling_profiler(duration_seconds: float = 30.0, interval_ms: float = 10.0, output_file: str = "", response_format: str = "text"):
+    logger.info(f"start_sampling_profiler is called.")
+    try:
+        if output_file == "":
+            output_path = make_output_path(base_path)
+            output_file = str(output_path / f"profile_{int(time.time())}.folded")
+        duration = min(max(duration_seconds, 1.0), 600.0)
+        start_profiler(output_file, duration, max(interval_ms, 1.0) / 1000)
+        return _make_content(
+            response_format,
+            f"Success. Profiling for {duration} seconds, stacks will be saved as: {output_file}",
+            {"file": output_file, "duration": duration},
+        )
+    except Exception as e:
+        logger.exception(f"Error in start_sampling_profiler: {str(e)}")
+        return _make_error_content(response_format, str(e))
+
+@mcp.tool(
+    description="""Report the readiness of this server instance and the progress of its startup warmup:
+    pooled connections to the Mobvoi hosts (connections_warm is false once they have expired), speaker list prefetch and pre-synthesis of the phrase bank manifest.
+    Route traffic to the instance once ready is true; state is "degraded" while a failed stage is retried. It also reports the admission control load: running, queued, shed and expired calls
+    per priority class, and the EWMA latency, error rate and health of every Mobvoi endpoint.
+    This tool bypasses admission control, so it answers even when the server is overloaded.
+
+    Args:
+        response_format: "json" (default) for a compact JSON object, or "text".
+
+    Returns:
+        The warmup state, current stage, phrase progress and the last errors.
+    """
+)
+def warmup_status(response_format: str = "json"):
+    status = warmup.status()
+    status["admission"] = admission.stats()
+    status["endpoints"] = api_client.endpoint_stats()
+    text = ", ".join([f"{key}: {value}" for key, value in status.items()])
+    return _make_content(response_format, text, status)
+
+@mcp.tool(
+    description="""Report the disk usage of the files written by this server (synthesized audio, downloaded videos, phrase bank), per directory,
+    with the configured quotas and the number of files evicted by the retention sweeper.
+    Only files written by the server are counted and evicted, other files of the output directories are never touched.
+
+    Args:
+        response_format: "json" (default) for a compact JSON object, or "text".
+
+    Returns:
+        The usage per directory: file count, bytes, files being written, quota; and the eviction totals.
+    """
+)
+@admission.admit(INTERACTIVE)
+@tracer.wrap()
+def output_usage(response_format: str = "json"):
+    usage = {
+        "directories": retention.usage(),
+        "evicted_files": retention.evicted_files,
+        "evicted_bytes": retention.evicted_bytes,
+    }
+    lines = [f"{d['directory']}: {d['files']} files, {d['bytes']} bytes, {d['in_flight']} in flight, quota: {d['quota']}" for d in usage["directories"]]
+    lines.append(f"Evicted {usage['evicted_files']} files, {usage['evicted_bytes']} bytes.")
+    return _make_content(response_format, "\n".join(lines), usage)
+
+warmup = Warmup(
+    connect=api_client.warmup_connections,
+    fetch_speakers=_fetch_speaker_data,
+    phrase_bank=phrase_bank,
+    synthesize=_synthesize_phrase,
+    phrases=load_manifest(warmup_manifest) if warmup_manifest else [],
+    concurrency=warmup_concurrency,
+    keepalive_expiry=keepalive_expiry,
+)
 
 def main():
     logger.info("Starting MCP server")
-    mcp.run()
+    if warmup_enabled:
+        warmup.start()
+    else:
+        warmup.skip()
+    retention.start()
+    try:
+        mcp.run()
+    finally:
+        warmup.stop()
+        retention.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """Cache and token bucket state shared by all server processes of the machine.
+
+    MCP hosts start one server process per session, so the state lives in a SQLite
+    database in WAL mode: readers never block, writers serialize on the database lock
+    with a busy timeout. Every update is a single transaction, so a process crashing
+    mid-update leaves the previous state, and its locks are released by the OS.
+
+    Once opened, the store fails open: when the database cannot be used, reads miss,
+    writes are dropped and the limiter lets requests through, with a warning in the log.
+    """
+
+    def __init__(self, path: Path, busy_timeout: float = 5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.__local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection().executescript(_SCHEMA)
+
+    def __connection(self) -> sqlite3.Connection:
+        connection = getattr(self.__local, "connection", None)
+        if connection is None:
+            # autocommit mode, transactions are opened explicitly
+            connection = sqlite3.connect(str(self.path), timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def get(self, key: str):
+        try:
+            row = self.__connection().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store read failed for {key}: {str(e)}")
+            return None
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        try:
+            connection = self.__connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, separators=(",", ":")), time.time() + ttl),
+            )
+            if random.random() < 0.01:
+                connection.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store write failed for {key}: {str(e)}")
+
+    def delete(self, key: str):
+        try:
+            self.__connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store delete failed for {key}: {str(e)}")
+
+    def take_token(self, name: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """
+        Take tokens from a shared token bucket.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before retrying
+        """
+        try:
+            connection = self.__connection()
+            # BEGIN IMMEDIATE takes the write lock up front, the read-modify-write is atomic across processes
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = connection.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0) * rate)
+                wait = 0.0
+                if tokens >= cost:
+                    tokens -= cost
+                else:
+                    wait = (cost - tokens) / rate
+                connection.execute(
+                    "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)", (name, tokens, now)
+                )
+                connection.execute("COMMIT")
+                return wait
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Shared store token bucket {name} failed, letting the request through: {str(e)}")
+            return 0.0
+
+
+class LocalStore:
+    """In-process stand-in of SharedStore, used when the shared state is disabled or cannot be opened."""
+
+    def __init__(self):
+        self.__cache = {}
+        self.__buckets = {}
+        self.__lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.__lock:
+            entry = self.__cache.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def set(self, key: str, value, ttl: float):
+        with self.__lock:
+            self.__cache[key] = (value, time.time() + ttl)
+
+    def delete(self, key: str):
+        with self.__lock:
+            self.__cache.pop(key, None)
+
+    def take_token(self, name: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        with self.__lock:
+            now = time.time()
+            tokens, updated_at = self.__buckets.get(name, (burst, now))
+            tokens = min(burst, tokens + max(now - updated_at, 0) * rate)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self.__buckets[name] = (tokens, now)
+            return wait
+
+
+class RateLimitExceededError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Token bucket limiter whose budget is shared by all processes using the same store and name."""
+
+    def __init__(self, store, name: str, rate: float, burst: float):
+        self.store = store
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+
+    def acquire(self, timeout: Optional[float] = None):
+        deadline_at = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.store.take_token(self.name, self.rate, self.burst)
+            if wait <= 0:
+                return
+            if deadline_at is not None and time.monotonic() + wait > deadline_at:
+                raise RateLimitExceededError(f"Rate limit {self.name} exceeded, no token available in time")
+            time.sleep(wait)
+
+
+def open_shared_store(state_dir: str):
+    """Open the shared store of the state directory, falling back to a LocalStore if it cannot be opened."""
+    path = Path(os.path.expanduser(state_dir)) / "shared.db"
+    try:
+        return SharedStore(path)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Failed to open shared store {path}, state is per process: {str(e)}")
+        return LocalStore()
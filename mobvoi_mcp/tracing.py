@@ -0,0 +1,237 @@
+import atexit
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import httpx
+
+import mobvoi_mcp
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar("mobvoi_mcp_current_span", default=None)
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class SpanExporter:
+    """Batch finished spans and export them as OTLP/JSON.
+
+    The target is either a local file, where each batch is appended as one
+    ExportTraceServiceRequest JSON line, or an http(s) url of an OTLP/HTTP collector
+    (e.g. http://localhost:4318/v1/traces).
+    """
+
+    def __init__(self, target: str, flush_interval: float = 2.0, max_batch: int = 256):
+        self.target = target
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.__queue = queue.Queue(maxsize=max_batch * 64)
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, name="mobvoi-mcp-span-exporter", daemon=True)
+        self.__thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        try:
+            self.__queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("Span export queue is full, dropping span")
+
+    def __drain(self) -> list[Span]:
+        spans = []
+        while len(spans) < self.max_batch:
+            try:
+                spans.append(self.__queue.get_nowait())
+            except queue.Empty:
+                break
+        return spans
+
+    def __write(self, spans: list[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _otlp_attribute("service.name", "mobvoi-mcp"),
+                    _otlp_attribute("service.version", mobvoi_mcp.__version__),
+                    _otlp_attribute("process.pid", os.getpid()),
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "mobvoi_mcp"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+        body = json.dumps(payload, separators=(",", ":"))
+        if self.target.startswith(("http://", "https://")):
+            httpx.post(self.target, content=body, headers={"Content-Type": "application/json"}, timeout=5)
+        else:
+            with open(os.path.expanduser(self.target), "a", encoding="utf-8") as f:
+                f.write(body + "\n")
+
+    def flush(self):
+        with self.__lock:
+            while True:
+                spans = self.__drain()
+                if not spans:
+                    return
+                try:
+                    self.__write(spans)
+                except Exception as e:
+                    logger.warning(f"Failed to export {len(spans)} spans to {self.target}: {str(e)}")
+                    return
+
+    def __run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class Tracer:
+    """Lightweight tracer with head sampling.
+
+    The sampling decision is taken when a root span starts and inherited by all its
+    children, so a trace is either recorded completely or not at all. Unsampled spans
+    only cost a context variable lookup.
+    """
+
+    def __init__(self):
+        self.sample_rate = 0.0
+        self.exporter = None
+
+    def configure(self, sample_rate: float, exporter: Optional[SpanExporter]):
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes):
+        parent = _current_span.get()
+        if not self.enabled or (parent is not None and not parent.sampled):
+            yield None
+            return
+        if parent is None:
+            sampled = random.random() < self.sample_rate
+            if not sampled:
+                token = _current_span.set(Span(name, "", None, False, {}))
+                try:
+                    yield None
+                finally:
+                    _current_span.reset(token)
+                return
+            span = Span(name, "%032x" % random.getrandbits(128), None, True, attributes)
+        else:
+            span = Span(name, parent.trace_id, parent.span_id, True, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {str(e)}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self.exporter.export(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, **attributes):
+        """Record an already finished child span of the current span."""
+        parent = _current_span.get()
+        if parent is None or not parent.sampled or not self.enabled:
+            return
+        span = Span(name, parent.trace_id, parent.span_id, True, attributes)
+        span.start_ns = start_ns
+        span.end_ns = end_ns
+        self.exporter.export(span)
+
+    def httpx_trace_hook(self) -> Optional[Callable]:
+        """Return an httpx "trace" extension recording connection and transfer phases as spans.
+
+        httpcore emits "<phase>.started" / "<phase>.complete" events (connect_tcp, start_tls,
+        send_request_headers, receive_response_headers, receive_response_body, ...).
+        """
+        parent = _current_span.get()
+        if parent is None or not parent.sampled or not self.enabled:
+            return None
+        started = {}
+
+        def hook(event_name: str, info: dict):
+            phase, _, state = event_name.rpartition(".")
+            now = time.time_ns()
+            if state == "started":
+                started[phase] = now
+            elif state in ("complete", "failed") and phase in started:
+                span = Span(f"http.{phase}", parent.trace_id, parent.span_id, True, {})
+                span.start_ns = started.pop(phase)
+                span.end_ns = now
+                if state == "failed":
+                    span.error = str(info.get("exception", "failed"))
+                self.exporter.export(span)
+
+        return hook
+
+    def wrap(self, name: Optional[str] = None):
+        """Decorate a function so that every call runs in its own span."""
+        def decorator(func: Callable):
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+tracer = Tracer()
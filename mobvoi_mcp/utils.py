@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import subprocess
@@ -6,6 +7,11 @@ from fuzzywuzzy import fuzz
 from datetime import datetime
 from typing import Optional, Iterator, Union
 
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:
+    orjson = None
+
 class MobvoiMcpError(Exception):
     pass
 
@@ -241,6 +247,47 @@ def speaker_list_filter(speaker_list: list[dict]) -> list[dict]:
                 }
                 galaxy_speakers.append(speaker_info)
     return galaxy_speakers
+def dumps_compact(data) -> str:
+    """Serialize data to compact JSON, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def to_table(
+    records: list[dict], fields: Optional[list[str]] = None, offset: int = 0, limit: int = 0
+) -> dict:
+    """
+    Pack a list of records into a compact column/row table, with field projection and pagination.
+
+    Args:
+        records (list): The records to pack
+        fields (list): Keep only these fields, in this order. All fields are kept if empty
+        offset (int): Index of the first record to return
+        limit (int): Maximum number of records to return, 0 means no limit
+
+    Returns:
+        dict: {"columns": [...], "rows": [[...]], "total": N, "offset": offset}, with
+        "next_offset" set when more records are available
+    """
+    columns = list(fields) if fields else []
+    if not columns:
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    columns.append(key)
+    offset = max(offset, 0)
+    end = offset + limit if limit > 0 else len(records)
+    page = records[offset:end]
+    table = {
+        "columns": columns,
+        "rows": [[record.get(column) for column in columns] for record in page],
+        "total": len(records),
+        "offset": offset,
+    }
+    if end < len(records):
+        table["next_offset"] = end
+    return table
+
 class Language:
     def __init__(self, code: str, name: str, is_src: bool, is_target: bool):
         self.code = code
@@ -0,0 +1,152 @@
+"""Local preparation of voice cloning samples.
+
+batch_voice_clone prepares every sample in a separate `python -m mobvoi_mcp.voice_samples`
+process, so this module only depends on numpy and soundfile and never on the server module.
+A multiprocessing pool would not do: spawn and forkserver workers import the main module of
+the parent again, i.e. the server with all its startup side effects.
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import soundfile as sf
+
+SAMPLE_EXTENSIONS = [".wav", ".mp3", ".flac", ".ogg", ".aiff", ".aif"]
+
+
+def list_samples(paths: list[str]) -> list[Path]:
+    """Expand directories into the audio files they contain, keeping the given order."""
+    samples = []
+    for path in paths:
+        path = Path(os.path.expanduser(path))
+        if path.is_dir():
+            samples.extend(sorted([p for p in path.iterdir() if p.is_file() and p.suffix.lower() in SAMPLE_EXTENSIONS]))
+        else:
+            samples.append(path)
+    return samples
+
+
+def _trim_silence(samples: np.ndarray, sample_rate: int, top_db: float, padding: float = 0.1) -> np.ndarray:
+    """Trim leading and trailing frames quieter than top_db below the loudest frame, pauses inside are kept."""
+    frame = max(int(sample_rate * 0.02), 1)
+    frame_count = len(samples) // frame
+    if frame_count == 0:
+        return samples
+    rms = np.sqrt(np.mean(samples[:frame_count * frame].reshape(frame_count, frame) ** 2, axis=1))
+    threshold = rms.max() * 10 ** (-top_db / 20)
+    voiced = np.nonzero(rms > threshold)[0]
+    if len(voiced) == 0:
+        return samples[:0]
+    pad = int(sample_rate * padding)
+    start = max(voiced[0] * frame - pad, 0)
+    end = min((voiced[-1] + 1) * frame + pad, len(samples))
+    return samples[start:end]
+
+
+def _resample(samples: np.ndarray, sample_rate: int, target_rate: int) -> np.ndarray:
+    """Band-limited resampling in the frequency domain, exact for a whole clip."""
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    target_length = int(round(len(samples) * target_rate / sample_rate))
+    spectrum = np.fft.rfft(samples)
+    bins = target_length // 2 + 1
+    if bins <= len(spectrum):
+        spectrum = spectrum[:bins]
+    else:
+        spectrum = np.pad(spectrum, (0, bins - len(spectrum)))
+    return np.fft.irfft(spectrum, target_length) * (target_length / len(samples))
+
+
+def prepare_sample(
+    source: str,
+    output_dir: str,
+    sample_rate: int = 24000,
+    audio_format: str = "mp3",
+    top_db: float = 40.0,
+) -> dict:
+    """
+    Decode, trim silence, downmix, resample and compress one voice sample.
+
+    Args:
+        source: Path of the original sample.
+        output_dir: Directory where the prepared sample is written.
+        sample_rate: Sample rate of the prepared sample.
+        audio_format: "mp3", or "wav" for 16 bit PCM. mp3 falls back to wav when libsndfile cannot encode it.
+        top_db: Frames quieter than this many dB below the loudest frame are trimmed at both ends.
+
+    Returns:
+        dict: {"file", "prepared_file", "duration", "original_bytes", "prepared_bytes"}
+    """
+    samples, original_rate = sf.read(source, dtype="float32", always_2d=True)
+    samples = samples.mean(axis=1)
+    samples = _trim_silence(samples, original_rate, top_db)
+    if len(samples) == 0:
+        raise ValueError(f"{source} is silent")
+    samples = np.clip(_resample(samples, original_rate, sample_rate), -1.0, 1.0)
+
+    if audio_format == "mp3" and "MP3" not in sf.available_formats():
+        audio_format = "wav"
+    # samples from different directories may share a name
+    name = f"{Path(source).stem}_{hashlib.md5(str(source).encode('utf8')).hexdigest()[:8]}.{audio_format}"
+    prepared_file = os.path.join(output_dir, name)
+    if audio_format == "mp3":
+        sf.write(prepared_file, samples, sample_rate, format="MP3", subtype="MPEG_LAYER_III")
+    else:
+        sf.write(prepared_file, samples, sample_rate, format="WAV", subtype="PCM_16")
+    return {
+        "file": str(source),
+        "prepared_file": prepared_file,
+        "duration": round(len(samples) / sample_rate, 3),
+        "original_bytes": os.path.getsize(source),
+        "prepared_bytes": os.path.getsize(prepared_file),
+    }
+
+
+def prepare_sample_in_subprocess(
+    source: str,
+    output_dir: str,
+    sample_rate: int = 24000,
+    audio_format: str = "mp3",
+    timeout: Optional[float] = None,
+) -> dict:
+    """Run prepare_sample in a separate interpreter, see the module docstring."""
+    args = [
+        sys.executable, "-m", "mobvoi_mcp.voice_samples",
+        str(Path(source).absolute()), str(Path(output_dir).absolute()),
+        "--sample-rate", str(sample_rate), "--audio-format", audio_format,
+    ]
+    # run from the directory holding the package, so that -m finds it even when it is not installed
+    package_root = Path(__file__).resolve().parents[1]
+    try:
+        result = subprocess.run(args, cwd=package_root, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TimeoutError(f"Preparing {source} did not finish within {timeout:.0f} seconds")
+    if result.returncode != 0:
+        lines = result.stderr.decode("utf8", errors="replace").strip().splitlines()
+        raise ValueError(lines[-1] if lines else f"exit code {result.returncode}")
+    return json.loads(result.stdout)
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Prepare one voice cloning sample, prints the result as JSON.")
+    parser.add_argument("source", help="Path of the original sample")
+    parser.add_argument("output_dir", help="Directory where the prepared sample is written")
+    parser.add_argument("--sample-rate", type=int, default=24000, help="Sample rate of the prepared sample, default 24000")
+    parser.add_argument("--audio-format", choices=["mp3", "wav"], default="mp3", help="Format of the prepared sample, default mp3")
+    args = parser.parse_args(argv)
+
+    try:
+        prepared = prepare_sample(args.source, args.output_dir, args.sample_rate, args.audio_format)
+    except Exception as e:
+        sys.exit(f"{type(e).__name__}: {str(e)}")
+    print(json.dumps(prepared))
+
+
+if __name__ == "__main__":
+    main()
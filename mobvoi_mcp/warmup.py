@@ -0,0 +1,268 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# synthesis parameters that change the audio, in the order they are hashed
+PHRASE_PARAMS = ["text", "speaker", "audio_type", "speed", "rate", "volume", "pitch"]
+PHRASE_DEFAULTS = {
+    "speaker": "xiaoyi_meet_24k",
+    "audio_type": "mp3",
+    "speed": 1.0,
+    "rate": 24000,
+    "volume": 1.0,
+    "pitch": 0.0,
+}
+
+
+def phrase_key(phrase: dict) -> str:
+    """Stable hash of the synthesis parameters of a phrase, missing ones take the tool defaults."""
+    params = dict(PHRASE_DEFAULTS)
+    params.update({key: value for key, value in phrase.items() if key in PHRASE_PARAMS})
+    for name in ["speed", "volume", "pitch"]:
+        params[name] = float(params[name])
+    params["rate"] = int(params["rate"])
+    key = "\x1f".join([str(params.get(name, "")) for name in PHRASE_PARAMS])
+    return hashlib.sha1(key.encode("utf8")).hexdigest()
+
+
+class PhraseBank:
+    """Directory of pre-synthesized audio, keyed by the hash of the synthesis parameters.
+
+    When a retention manager is given, banked files are recorded in it and hits refresh
+    their last use, so the bank can be bounded by an LRU quota.
+    """
+
+    def __init__(self, directory: Path, retention=None):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.retention = retention
+
+    def path_for(self, phrase: dict) -> Path:
+        audio_type = phrase.get("audio_type", PHRASE_DEFAULTS["audio_type"])
+        return self.directory / f"{phrase_key(phrase)}.{audio_type}"
+
+    def get(self, phrase: dict) -> Optional[Path]:
+        path = self.path_for(phrase)
+        if not path.exists():
+            return None
+        if self.retention is not None:
+            self.retention.touch(path)
+        return path
+
+    def put(self, phrase: dict, synthesize: Callable) -> Path:
+        """Synthesize the phrase into the bank, written under a temporary name and renamed atomically."""
+        path = self.path_for(phrase)
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            synthesize(temp_path, phrase)
+            os.replace(temp_path, path)
+            if self.retention is not None:
+                self.retention.record(path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return path
+
+
+def load_manifest(manifest_path: str) -> list[dict]:
+    """
+    Load the phrases of a warmup manifest.
+
+    The manifest is a JSON file with explicit phrases and/or a speakers x texts product:
+        {
+            "phrases": [{"text": "...", "speaker": "...", "rate": 16000}, ...],
+            "speakers": ["xiaoyi_meet_24k", ...],
+            "texts": ["Welcome", ...],
+            "options": {"audio_type": "mp3", "rate": 24000}
+        }
+    "options" are applied to every phrase that does not override them.
+    """
+    with open(os.path.expanduser(manifest_path), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    options = manifest.get("options", {})
+    phrases = []
+    for phrase in manifest.get("phrases", []):
+        phrases.append({**options, **phrase})
+    for speaker in manifest.get("speakers", []):
+        for text in manifest.get("texts", []):
+            phrases.append({**options, "text": text, "speaker": speaker})
+    return [phrase for phrase in phrases if phrase.get("text")]
+
+
+class Warmup:
+    """Background warmup stage run at server start.
+
+    Stages run in order: pre-open pooled connections, prefetch the speaker list, then
+    pre-synthesize the manifest phrases into the phrase bank with bounded concurrency.
+    A failing stage is logged and does not prevent the next ones, but the warmup then
+    ends "degraded" instead of "ready" and the instance is not reported ready.
+
+    Idle pooled connections expire, so once the stages are done the connections are opened
+    again every keepalive_expiry / 2 seconds until stop() is called, and the failed stages
+    are run again at the same pace until they succeed. Connections are reported warm while
+    the last successful connect is more recent than keepalive_expiry, and a ready instance
+    whose connections went cold is not reported ready.
+
+    Args:
+        connect: Callable() opening the pooled connections.
+        fetch_speakers: Callable() fetching the speaker list into the cache.
+        phrase_bank: Bank receiving the synthesized phrases, or None to skip the stage.
+        synthesize: Callable(output_file, phrase) synthesizing one phrase.
+        phrases: Phrases to pre-synthesize.
+        concurrency: Maximum number of phrases synthesized at the same time.
+        keepalive_expiry: Seconds an idle pooled connection is kept open, 0 disables the refresh.
+    """
+
+    def __init__(
+        self,
+        connect: Callable,
+        fetch_speakers: Callable,
+        phrase_bank: Optional[PhraseBank] = None,
+        synthesize: Optional[Callable] = None,
+        phrases: Optional[list[dict]] = None,
+        concurrency: int = 4,
+        keepalive_expiry: float = 0,
+    ):
+        self.connect = connect
+        self.fetch_speakers = fetch_speakers
+        self.phrase_bank = phrase_bank
+        self.synthesize = synthesize
+        self.phrases = phrases or []
+        self.concurrency = max(concurrency, 1)
+        self.keepalive_expiry = keepalive_expiry
+        self.state = "pending"
+        self.stage = None
+        self.errors = []
+        self.phrases_done = 0
+        self.phrases_cached = 0
+        self.phrases_failed = 0
+        self.started_at = None
+        self.finished_at = None
+        self.connected_at = None
+        self.failed_stages = []
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+    @property
+    def ready(self) -> bool:
+        if self.state == "skipped":
+            return True
+        return self.state == "ready" and (self.keepalive_expiry <= 0 or self.connections_warm)
+
+    @property
+    def connections_warm(self) -> bool:
+        if self.connected_at is None:
+            return False
+        return self.keepalive_expiry <= 0 or time.time() - self.connected_at < self.keepalive_expiry
+
+    def skip(self):
+        with self.__lock:
+            self.state = "skipped"
+
+    def status(self) -> dict:
+        with self.__lock:
+            elapsed = None
+            if self.started_at is not None:
+                elapsed = round((self.finished_at or time.time()) - self.started_at, 3)
+            return {
+                "state": self.state,
+                "ready": self.ready,
+                "stage": self.stage,
+                "failed_stages": list(self.failed_stages),
+                "connections_warm": self.connections_warm,
+                "phrases_total": len(self.phrases),
+                "phrases_done": self.phrases_done,
+                "phrases_cached": self.phrases_cached,
+                "phrases_failed": self.phrases_failed,
+                "elapsed": elapsed,
+                "errors": self.errors[-10:],
+            }
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.run, name="mobvoi-mcp-warmup", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+
+    def __run_stage(self, stage: str, func: Callable) -> bool:
+        with self.__lock:
+            self.stage = stage
+        start = time.perf_counter()
+        try:
+            func()
+            logger.info(f"Warmup stage {stage} finished in {time.perf_counter() - start:.2f}s")
+            return True
+        except Exception as e:
+            logger.exception(f"Warmup stage {stage} failed: {str(e)}")
+            with self.__lock:
+                self.errors.append(f"{stage}: {str(e)}")
+            return False
+
+    def __run_stages(self, stages: list[str]):
+        funcs = {"connections": self.__connect, "speakers": self.fetch_speakers, "phrases": self.__synthesize_phrases}
+        failed = [stage for stage in stages if not self.__run_stage(stage, funcs[stage])]
+        with self.__lock:
+            self.stage = None
+            self.failed_stages = failed
+            self.state = "degraded" if failed else "ready"
+
+    def __connect(self):
+        self.connect()
+        with self.__lock:
+            self.connected_at = time.time()
+
+    def __keep_connections(self):
+        interval = self.keepalive_expiry / 2
+        while not self.__stopped.wait(interval):
+            if self.failed_stages:
+                self.__run_stages(self.failed_stages)
+                if not self.failed_stages:
+                    logger.info("Warmup recovered, the failed stages succeeded")
+                continue
+            try:
+                self.__connect()
+            except Exception as e:
+                logger.warning(f"Warmup failed to refresh the pooled connections: {str(e)}")
+
+    def __synthesize_phrase(self, phrase: dict):
+        try:
+            if self.phrase_bank.get(phrase) is not None:
+                with self.__lock:
+                    self.phrases_cached += 1
+            else:
+                self.phrase_bank.put(phrase, self.synthesize)
+        except Exception as e:
+            logger.warning(f"Warmup failed to synthesize phrase {phrase.get('text', '')[:20]!r}: {str(e)}")
+            with self.__lock:
+                self.phrases_failed += 1
+                self.errors.append(f"phrases: {str(e)}")
+        finally:
+            with self.__lock:
+                self.phrases_done += 1
+
+    def __synthesize_phrases(self):
+        if self.phrase_bank is None or self.synthesize is None:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(self.__synthesize_phrase, self.phrases))
+
+    def run(self):
+        with self.__lock:
+            self.state = "running"
+            self.started_at = time.time()
+        self.__run_stages(["connections", "speakers", "phrases"])
+        with self.__lock:
+            self.finished_at = time.time()
+        logger.info(f"Warmup finished: {self.status()}")
+        if self.keepalive_expiry > 0:
+            self.__keep_connections()
@@ -0,0 +1,219 @@
+import asyncio
+import random
+import threading
+
+import pytest
+
+from mobvoi_mcp.admission import (
+    BULK,
+    INTERACTIVE,
+    AdmissionController,
+    AdmissionRejectedError,
+    DeadlineExceededError,
+)
+
+
+def assert_idle(admission: AdmissionController):
+    for priority, stats in admission.stats().items():
+        assert stats["running"] == 0, f"{priority}: {stats}"
+        assert stats["queued"] == 0, f"{priority}: {stats}"
+
+
+def make_tools(admission: AdmissionController, release: threading.Event, order: list):
+    @admission.admit(INTERACTIVE)
+    def interactive(name: str = "interactive"):
+        order.append(name)
+        release.wait(5)
+        return name
+
+    @admission.admit(BULK)
+    def bulk(name: str = "bulk"):
+        order.append(name)
+        release.wait(5)
+        return name
+
+    return interactive, bulk
+
+
+async def wait_until(predicate, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.005)
+
+
+def test_interactive_calls_are_dispatched_before_bulk_calls():
+    admission = AdmissionController(max_concurrency=1, interactive_reserved=0)
+    release, order = threading.Event(), []
+    interactive, bulk = make_tools(admission, release, order)
+
+    async def main():
+        holder = asyncio.create_task(bulk("holder"))
+        await wait_until(lambda: order == ["holder"])
+        queued_bulk = asyncio.create_task(bulk("bulk"))
+        await asyncio.sleep(0.01)
+        queued_interactive = asyncio.create_task(interactive("interactive"))
+        await wait_until(lambda: admission.stats()["interactive"]["queued"] == 1)
+        release.set()
+        await asyncio.gather(holder, queued_bulk, queued_interactive)
+
+    asyncio.run(main())
+    assert order == ["holder", "interactive", "bulk"]
+    assert_idle(admission)
+
+
+def test_bulk_calls_leave_the_reserved_slots_to_interactive_calls():
+    admission = AdmissionController(max_concurrency=2, interactive_reserved=1)
+    release, order = threading.Event(), []
+    interactive, bulk = make_tools(admission, release, order)
+
+    async def main():
+        tasks = [asyncio.create_task(bulk(f"bulk{i}")) for i in range(2)]
+        await wait_until(lambda: len(order) == 1)
+        assert admission.stats()["bulk"]["running"] == 1
+        assert admission.stats()["bulk"]["queued"] == 1
+        tasks.append(asyncio.create_task(interactive("interactive")))
+        await wait_until(lambda: "interactive" in order)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["bulk0", "interactive", "bulk1"]
+    assert_idle(admission)
+
+
+def test_calls_arriving_at_a_full_queue_are_shed():
+    admission = AdmissionController(max_concurrency=1, queue_limits={INTERACTIVE: 1})
+    release, order = threading.Event(), []
+    interactive, _ = make_tools(admission, release, order)
+
+    async def main():
+        holder = asyncio.create_task(interactive("holder"))
+        await wait_until(lambda: order == ["holder"])
+        queued = asyncio.create_task(interactive("queued"))
+        await wait_until(lambda: admission.stats()["interactive"]["queued"] == 1)
+        with pytest.raises(AdmissionRejectedError):
+            await interactive("shed")
+        release.set()
+        await asyncio.gather(holder, queued)
+
+    asyncio.run(main())
+    assert order == ["holder", "queued"]
+    assert admission.stats()["interactive"]["shed"] == 1
+    assert_idle(admission)
+
+
+def test_rejected_calls_get_the_default_arguments_of_the_tool():
+    rejected = []
+    admission = AdmissionController(
+        max_concurrency=1, queue_limits={INTERACTIVE: 0}, reject=lambda error, kwargs: rejected.append(kwargs)
+    )
+    release, order = threading.Event(), []
+
+    @admission.admit(INTERACTIVE)
+    def tool(text: str, response_format: str = "json"):
+        order.append(text)
+        release.wait(5)
+
+    async def main():
+        holder = asyncio.create_task(tool("holder"))
+        await wait_until(lambda: order == ["holder"])
+        await tool(text="a")
+        await tool(text="b", response_format="text")
+        release.set()
+        await holder
+
+    asyncio.run(main())
+    assert rejected == [{"text": "a", "response_format": "json"}, {"text": "b", "response_format": "text"}]
+
+
+def test_queue_timeout_releases_nothing_it_did_not_take():
+    admission = AdmissionController(max_concurrency=1)
+    release, order = threading.Event(), []
+    interactive, _ = make_tools(admission, release, order)
+
+    async def main():
+        holder = asyncio.create_task(interactive("holder"))
+        await wait_until(lambda: order == ["holder"])
+        with pytest.raises(DeadlineExceededError):
+            await interactive("late", deadline_seconds=0.05)
+        assert admission.stats()["interactive"]["running"] == 1
+        release.set()
+        await holder
+
+    asyncio.run(main())
+    assert order == ["holder"]
+    assert admission.stats()["interactive"]["expired"] == 1
+    assert_idle(admission)
+
+
+def test_cancelled_queued_calls_leave_no_slot_behind():
+    admission = AdmissionController(max_concurrency=1)
+    release, order = threading.Event(), []
+    interactive, _ = make_tools(admission, release, order)
+
+    async def main():
+        holder = asyncio.create_task(interactive("holder"))
+        await wait_until(lambda: order == ["holder"])
+        queued = asyncio.create_task(interactive("queued"))
+        await wait_until(lambda: admission.stats()["interactive"]["queued"] == 1)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert admission.stats()["interactive"]["queued"] == 0
+        release.set()
+        await holder
+
+    asyncio.run(main())
+    assert order == ["holder"]
+    assert_idle(admission)
+
+
+def test_call_cancelled_right_after_its_slot_was_handed_over_releases_it():
+    admission = AdmissionController(max_concurrency=1)
+    release, order = threading.Event(), []
+    interactive, _ = make_tools(admission, release, order)
+
+    async def main():
+        holder = asyncio.create_task(interactive("holder"))
+        await wait_until(lambda: order == ["holder"])
+        queued = asyncio.create_task(interactive("queued"))
+        await wait_until(lambda: admission.stats()["interactive"]["queued"] == 1)
+        release.set()
+        await holder
+        # the slot is handed over when the holder finishes, the queued call has not resumed yet
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+
+    asyncio.run(main())
+    assert_idle(admission)
+
+
+def test_slots_are_never_leaked_under_timeouts_and_cancellations():
+    admission = AdmissionController(max_concurrency=2, queue_limits={INTERACTIVE: 1000, BULK: 1000})
+    rng = random.Random(7)
+
+    @admission.admit(INTERACTIVE)
+    def interactive(duration: float):
+        threading.Event().wait(duration)
+
+    @admission.admit(BULK)
+    def bulk(duration: float):
+        threading.Event().wait(duration)
+
+    async def main():
+        tasks = []
+        for _ in range(200):
+            tool = interactive if rng.random() < 0.5 else bulk
+            deadline = rng.choice([0, 0.001, 0.005, 0.02, 0.05])
+            tasks.append(asyncio.create_task(tool(rng.random() * 0.005, deadline_seconds=deadline)))
+            if rng.random() < 0.2:
+                rng.choice(tasks).cancel()
+            await asyncio.sleep(rng.random() * 0.002)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(main())
+    stats = admission.stats()
+    assert stats["interactive"]["expired"] + stats["bulk"]["expired"] > 0
+    assert_idle(admission)